@@ -2,20 +2,36 @@ from testing.solution import Solution
 from data.containers.read import ReadContainer
 from ncbi.taxonomy.tree import TaxTree
 
+import heapq
+import numpy
+
 class LCABinner(object):
     ''' Lowest common ancestor implentation of binner.
 
     Each read is assigned to single taxon in taxonomy tree as the LCA
     of all its alignments.
+
+    As in MEGAN, alignments can be filtered before the LCA is found
+    (min_score, top_percent), and taxa with too few reads can be
+    merged into their ancestors afterwards (min_support).
     '''
 
-    def __init__(self, tax_tree):
+    def __init__(self, tax_tree, min_score=None, top_percent=None, min_support=None):
         ''' Constructor
 
         Args:
             tax_tree (TaxTree): Taxonomy tree
+            min_score (float): Alignments with lower score are ignored
+            top_percent (float): Only alignments with score within this
+                percentage of the best score of the read are used
+            min_support (int): Reads assigned to a taxon with fewer reads
+                are reassigned to its closest ancestor which has (together
+                with reads of its reassigned descendants) enough reads
         '''
         self.tax_tree = tax_tree
+        self.min_score = min_score
+        self.top_percent = top_percent
+        self.min_support = min_support
 
     def bin_reads(self, read_container):
         '''Assigns every read to one or none taxon.
@@ -28,20 +44,96 @@ class LCABinner(object):
             (Solution): New Solution instance with read assignments.
         '''
         sol = Solution.create_empty()
-        for read in read_container.fetch_all_reads():
+        (read_ids, offsets, tax_ids, scores) = read_container.get_taxid_arrays()
 
-            # Find LCA
-            tax_ids = map(lambda aln: aln.tax_id, read.get_alignments())
-            # Filter None tax_ids
-            # Some alignments may not have tax_id. This should be logged!
-            tax_ids_filtered = filter(lambda tax_id: tax_id != None, tax_ids)
+        # Alignments not passing score filters are ignored, as if they had no tax_id
+        used = self._filter_alignments(offsets, scores)
+        if used is not None:
+            tax_ids = numpy.where(used, tax_ids, ReadContainer.NO_TAXID)
 
-            # Skip read with no valid alignments (also log?) 
-            if len(tax_ids_filtered) == 0:
-                continue
-            lca = self.tax_tree.find_lca(tax_ids_filtered)
+        # LCAs of all the reads at once
+        lcas = self.tax_tree.batch_lca(offsets, tax_ids)
+
+        # Skip reads with no valid alignments (also log?)
+        # Some alignments may not have tax_id. This should be logged!
+        has_tax_id = numpy.r_[0, numpy.cumsum(tax_ids != ReadContainer.NO_TAXID)]
+        assigned = numpy.flatnonzero(numpy.diff(has_tax_id[offsets]) > 0)
+
+        lcas = lcas[assigned]
+        if self.min_support:
+            lcas = self._apply_min_support(lcas)
 
-            # Store assignment
-            sol.add_assignment(read.id, lca)
+        # Store assignments
+        for (i, lca) in zip(assigned.tolist(), lcas.tolist()):
+            sol.add_assignment(read_ids[i], lca)
 
         return sol
+
+    def _filter_alignments(self, offsets, scores):
+        '''Applies min_score and top_percent filters to all the alignments.
+
+        Args:
+            offsets (numpy.int64 array): CSR offsets of read alignments
+            scores (numpy.float64 array): Alignment scores
+        Returns:
+            (numpy.bool_ array): True for alignments passing the filters,
+            None if no filter is set
+        '''
+        if self.min_score is None and self.top_percent is None:
+            return None
+        used = numpy.ones(len(scores), dtype=bool)
+        if self.min_score is not None:
+            used &= scores >= self.min_score
+        if self.top_percent is not None and len(scores):
+            # best score of every read, over alignments passing min_score
+            counts = numpy.diff(offsets)
+            nonempty = numpy.flatnonzero(counts > 0)
+            best = numpy.maximum.reduceat(numpy.where(used, scores, -numpy.inf),
+                                          offsets[nonempty])
+            best = numpy.repeat(best, counts[nonempty])
+            used &= scores >= best * (1. - self.top_percent / 100.)
+        return used
+
+    def _apply_min_support(self, lcas):
+        '''Reassigns reads of taxa with fewer than min_support reads.
+
+        Taxa are processed from the deepest one, a taxon without enough
+        reads passes all its reads to its parent.
+
+        Args:
+            lcas (numpy.int64 array): Taxon of every assigned read
+        Returns:
+            (numpy.int64 array): Taxon of every read after reassignment
+        '''
+        tax_tree = self.tax_tree
+        # return_counts of numpy.unique is not available in numpy 1.8
+        (taxa, read_taxa) = numpy.unique(lcas, return_inverse=True)
+        counts = numpy.bincount(read_taxa, minlength=len(taxa))
+        support = dict(zip(taxa.tolist(), counts.tolist()))
+        depth = dict((taxon, tax_tree.index.depth[index]) for (taxon, index)
+                     in zip(taxa.tolist(), tax_tree.index.get_indexes(taxa).tolist())
+                     if index != tax_tree.index.NO_INDEX)
+
+        # deepest taxa first
+        heap = [(-taxon_depth, taxon) for (taxon, taxon_depth) in depth.items()]
+        heapq.heapify(heap)
+        moved_to = {}
+        while heap:
+            (negative_depth, taxon) = heapq.heappop(heap)
+            if taxon == tax_tree.root or support[taxon] >= self.min_support:
+                continue
+            parent = tax_tree.parent_nodes[taxon]
+            if parent not in support:
+                support[parent] = 0
+                heapq.heappush(heap, (negative_depth + 1, parent))
+            support[parent] += support[taxon]
+            support[taxon] = 0
+            moved_to[taxon] = parent
+
+        # final taxon of every original taxon
+        targets = []
+        for taxon in taxa.tolist():
+            while taxon in moved_to:
+                taxon = moved_to[taxon]
+            targets.append(taxon)
+        return numpy.array(targets, dtype=numpy.int64)[read_taxa]
@@ -5,48 +5,13 @@ from utils.autoslots import Autoslots
 
 import numpy
 
-class ReadAlnLocation (Autoslots):
-    """ Contains information on alignment location on
-        an NT nucleotide string
+class AlignedCdsMixin (object):
+    """ Determination of the CDSs covered by a read alignment.
+        Shared by ReadAlnLocation and the alignment views of
+        AlignmentTable (data.table). Expects nucleotide_accession,
+        location_span and a writable aligned_cdss attribute.
     """
-
-    def __init__ (self, read_id, nucleotide_accession, db_source, genome_index, score,
-                  location_span, complement, active=True):
-        self.read_id                = read_id
-        self.nucleotide_accession   = nucleotide_accession
-        self.db_source              = db_source
-        self.genome_index           = genome_index
-        self.score                  = score
-        self.location_span          = location_span
-        self.complement             = complement
-        self.active                 = active
-        self.tax_id                 = None
-        self.potential_host         = None
-        # self.determine_coding_seqs()
-        # Sto je sa .aligned_cdss? Navesti to negdje u komentarima ako postoji!
-
-
-    def set_active (self, active):
-        '''
-        Sets active status for the read alignment.
-        Inactive reads do not go into CDS alignments.
-        '''
-        self.active = active
-
-    def set_potential_host_status (self, potential_host):
-        '''
-        Set to true if organism is potential host [child of
-        animalia kingdom]
-        @param potential_host (boolean)
-        '''
-        self.potential_host = potential_host
-
-    def is_potential_host (self):
-        """ Returns true if organism is potential host
-        (child of animalia kingdom), false otherwise.
-        @return (boolean)
-        """
-        return self.potential_host
+    __slots__ = ()
 
     def determine_coding_seqs (self, record_container):
         ''' Determines which of the CDSs in the record aligned_regions
@@ -219,6 +184,49 @@ class ReadAlnLocation (Autoslots):
         pass
 
 
+class ReadAlnLocation (AlignedCdsMixin, Autoslots):
+    """ Contains information on alignment location on
+        an NT nucleotide string
+    """
+
+    def __init__ (self, read_id, nucleotide_accession, db_source, genome_index, score,
+                  location_span, complement, active=True):
+        self.read_id                = read_id
+        self.nucleotide_accession   = nucleotide_accession
+        self.db_source              = db_source
+        self.genome_index           = genome_index
+        self.score                  = score
+        self.location_span          = location_span
+        self.complement             = complement
+        self.active                 = active
+        self.tax_id                 = None
+        self.potential_host         = None
+        # self.determine_coding_seqs()
+        # Sto je sa .aligned_cdss? Navesti to negdje u komentarima ako postoji!
+
+
+    def set_active (self, active):
+        '''
+        Sets active status for the read alignment.
+        Inactive reads do not go into CDS alignments.
+        '''
+        self.active = active
+
+    def set_potential_host_status (self, potential_host):
+        '''
+        Set to true if organism is potential host [child of
+        animalia kingdom]
+        @param potential_host (boolean)
+        '''
+        self.potential_host = potential_host
+
+    def is_potential_host (self):
+        """ Returns true if organism is potential host
+        (child of animalia kingdom), false otherwise.
+        @return (boolean)
+        """
+        return self.potential_host
+
 class CdsAlignment (Autoslots):
     ''' Contains all the alignment information for a single
         CDS, meaning:
@@ -0,0 +1,421 @@
+from data.alignment import ReadAlnLocation
+from data.read import Read
+from utils.binfile import write_arrays, read_arrays, pack_strings, StringTable, BinaryFileError
+from utils.compressed import open_input, is_compressed
+
+import collections
+import multiprocessing
+import os
+import numpy
+
+class AlignmentColumns (object):
+    ''' Column oriented storage of reads and their alignments,
+        as described by the binner alignment (.in) format.
+        Alignments of the i-th read are stored in rows
+        offsets[i]:offsets[i+1] of every alignment column.
+    '''
+
+    def __init__ (self, read_ids, offsets, accessions, accession_id,
+                  db_sources, db_source_id, genome_index, score, start,
+                  stop, complement):
+        '''
+        @param read_ids     ([str]) read id of each read
+        @param offsets      (numpy.int64 array) len(read_ids) + 1 row offsets
+        @param accessions   ([str]) nucleotide accessions referenced by
+                            accession_id
+        @param accession_id (numpy.int32 array) accession of every alignment
+        @param db_sources   ([str]) database sources referenced by db_source_id
+        @param db_source_id (numpy.int32 array) db source of every alignment
+        @param genome_index (numpy.int64 array) GI of every alignment
+        @param score        (numpy.float64 array)
+        @param start        (numpy.int64 array)
+        @param stop         (numpy.int64 array)
+        @param complement   (numpy.bool_ array) True for '-' strand
+        '''
+        self.read_ids       = read_ids
+        self.offsets        = offsets
+        self.accessions     = accessions
+        self.accession_id   = accession_id
+        self.db_sources     = db_sources
+        self.db_source_id   = db_source_id
+        self.genome_index   = genome_index
+        self.score          = score
+        self.start          = start
+        self.stop           = stop
+        self.complement     = complement
+
+    def get_read_count (self):
+        return len(self.read_ids)
+
+    def get_alignment_count (self):
+        return len(self.accession_id)
+
+    def get_read_index (self):
+        '''
+        Returns the index of the read every alignment belongs to.
+        @return (numpy.int64 array)
+        '''
+        return numpy.repeat(numpy.arange(self.get_read_count()),
+                            numpy.diff(self.offsets))
+
+    def to_read (self, read_num):
+        ''' Creates a Read object (with its alignment locations)
+            from the read_num-th read.
+        '''
+        return self.to_reads([read_num]).next()
+
+    def to_reads (self, read_nums=None):
+        ''' Creates Read objects from the stored columns.
+            @param read_nums (iterable of int) reads to create.
+            All reads if None.
+            @return generator of Read objects
+        '''
+        if read_nums is None:
+            read_nums = xrange(self.get_read_count())
+        offsets = self.offsets
+        for i in read_nums:
+            (lo, hi) = (offsets[i], offsets[i+1])
+            read_id = self.read_ids[i]
+            aln_locs = []
+            for (acc_id, src_id, gi, score, start, stop, complement) in zip(
+                    self.accession_id[lo:hi].tolist(),
+                    self.db_source_id[lo:hi].tolist(),
+                    self.genome_index[lo:hi].tolist(),
+                    self.score[lo:hi].tolist(),
+                    self.start[lo:hi].tolist(),
+                    self.stop[lo:hi].tolist(),
+                    self.complement[lo:hi].tolist()):
+                aln_locs.append(ReadAlnLocation(read_id, self.accessions[acc_id],
+                                self.db_sources[src_id], gi, score,
+                                (start, stop), complement))
+            yield Read(read_id, None, aln_locs)
+
+    def to_arrays (self):
+        ''' Returns all the columns as a dictionary of numpy arrays
+            (string lists are packed, see utils.binfile.pack_strings).
+        '''
+        arrays = {}
+        for name in ('offsets', 'accession_id', 'db_source_id', 'genome_index',
+                     'score', 'start', 'stop', 'complement'):
+            arrays[name] = getattr(self, name)
+        for name in ('read_ids', 'accessions', 'db_sources'):
+            (arrays[name + '_buf'], arrays[name + '_offsets']) = pack_strings(getattr(self, name))
+        return arrays
+
+    @staticmethod
+    def from_arrays (arrays):
+        ''' Creates alignment columns from arrays returned by to_arrays
+            (or their memory maps). Read ids are left packed.
+        '''
+        strings = lambda name: StringTable(arrays[name + '_buf'], arrays[name + '_offsets'])
+        return AlignmentColumns(strings('read_ids'), arrays['offsets'],
+                                strings('accessions').tolist(), arrays['accession_id'],
+                                strings('db_sources').tolist(), arrays['db_source_id'],
+                                arrays['genome_index'], arrays['score'],
+                                arrays['start'], arrays['stop'],
+                                arrays['complement'])
+
+    @staticmethod
+    def concatenate (parts):
+        ''' Joins several column sets (e.g. parsed chunks of the same
+            file) into one, preserving the read order.
+            @param parts ([AlignmentColumns])
+            @return AlignmentColumns
+        '''
+        parts = list(parts)
+        if not parts:
+            return parse_alignment_lines([])
+        if len(parts) == 1:
+            return parts[0]
+
+        read_ids = []
+        offsets  = [numpy.zeros(1, dtype=numpy.int64)]
+        row_count = 0
+        for part in parts:
+            read_ids.extend(part.read_ids)
+            offsets.append(part.offsets[1:] + row_count)
+            row_count += part.get_alignment_count()
+
+        (accessions, accession_id) = _merge_string_ids(
+                [(part.accessions, part.accession_id) for part in parts])
+        (db_sources, db_source_id) = _merge_string_ids(
+                [(part.db_sources, part.db_source_id) for part in parts])
+
+        column = lambda name: numpy.concatenate([getattr(part, name) for part in parts])
+        return AlignmentColumns(read_ids, numpy.concatenate(offsets),
+                                accessions, accession_id,
+                                db_sources, db_source_id,
+                                column('genome_index'), column('score'),
+                                column('start'), column('stop'),
+                                column('complement'))
+
+
+def parse_alignment_lines (lines):
+    ''' Parses lines of the binner alignment (.in) format into
+        alignment columns. Splitting is done once per line, while
+        all the numeric conversions are done by numpy over whole
+        columns at once.
+        Empty lines are skipped.
+
+        @param lines iterable of read strings (same as Read.from_read_str)
+        @return AlignmentColumns
+        @raise ValueError if an alignment is malformed
+    '''
+    read_ids    = []
+    aln_counts  = []
+    aln_strs    = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.endswith(';'):
+            line = line[0:-1]
+        values = line.split(';')
+
+        # header: read_id,num_align
+        read_id = values[0].split(',', 1)[0]
+        if read_id.startswith('@'):
+            read_id = read_id[1:]
+        read_ids.append(read_id)
+        aln_counts.append(len(values) - 1)
+        aln_strs.extend(values[1:])
+
+    # alignment: nucl_acc,db_source,GI,score,start,stop,strand
+    aln_count = len(aln_strs)
+    fields = ','.join(aln_strs).split(',') if aln_count else []
+    if len(fields) != 7 * aln_count:
+        raise ValueError('Alignment parsing error: expected 7 comma separated values per alignment.')
+
+    strand = numpy.array(fields[6::7], dtype=str)
+    complement = (strand == '-')
+    if not numpy.all(complement | (strand == '+')):
+        raise ValueError('Alignment parsing error: strand must be either + or -.')
+
+    (accessions, accession_id) = _to_string_ids(fields[0::7])
+    (db_sources, db_source_id) = _to_string_ids(fields[1::7])
+
+    offsets = numpy.zeros(len(read_ids) + 1, dtype=numpy.int64)
+    numpy.cumsum(aln_counts, out=offsets[1:])
+
+    return AlignmentColumns(read_ids, offsets,
+                            accessions, accession_id,
+                            db_sources, db_source_id,
+                            _to_numbers(fields[2::7], numpy.int64),
+                            _to_numbers(fields[3::7], numpy.float64),
+                            _to_numbers(fields[4::7], numpy.int64),
+                            _to_numbers(fields[5::7], numpy.int64),
+                            complement)
+
+def iter_alignment_columns (read_alignment_file, chunk_size=20000):
+    ''' Parses the alignment file in chunks of at most chunk_size reads.
+        @return generator of AlignmentColumns
+    '''
+    for lines in _iter_line_chunks(read_alignment_file, chunk_size):
+        yield parse_alignment_lines(lines)
+
+def parse_alignment_file (read_alignment_file, chunk_size=20000):
+    ''' Parses the whole alignment file into alignment columns.
+        The file is parsed in chunks of chunk_size reads to bound the
+        memory used by intermediate strings.
+        @return AlignmentColumns
+    '''
+    return AlignmentColumns.concatenate(
+            iter_alignment_columns(read_alignment_file, chunk_size))
+
+def parse_alignment_file_parallel (read_alignment_file, workers, chunk_size=20000):
+    ''' Parses the alignment file using a pool of worker processes.
+        The file is split into byte ranges aligned to line boundaries,
+        each range is parsed by one of the workers and the partial
+        results are joined in file order, so the result is the same
+        as the one of parse_alignment_file.
+        Compressed files cannot be split, they are decompressed by
+        this process and the workers parse chunks of chunk_size lines.
+
+        @param workers (int) number of worker processes
+        @return AlignmentColumns
+    '''
+    if workers <= 1:
+        return parse_alignment_file(read_alignment_file, chunk_size)
+    if is_compressed(read_alignment_file):
+        return _parse_compressed_file_parallel(read_alignment_file, workers, chunk_size)
+    # More ranges than workers, so that a slow range doesn't stall the pool
+    byte_ranges = split_file_ranges(read_alignment_file, workers * 4)
+    tasks = [(read_alignment_file, start, end, chunk_size) for (start, end) in byte_ranges]
+    pool = multiprocessing.Pool(workers)
+    try:
+        parts = pool.map(_parse_file_range, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return AlignmentColumns.concatenate(parts)
+
+def save_alignment_cache (columns, cache_fname, read_alignment_file=None, extra_arrays=None):
+    ''' Writes alignment columns to a binary cache file which can be
+        memory mapped with open_alignment_cache.
+        @param read_alignment_file alignment file the columns were parsed
+        from. Its size and modification time are stored, so that a stale
+        cache can be detected.
+        @param extra_arrays dict(key=name, value=numpy array) additional
+        per read or per alignment arrays to store along the columns
+    '''
+    arrays = columns.to_arrays()
+    for (name, array) in (extra_arrays or {}).items():
+        arrays['extra_' + name] = array
+    write_arrays(cache_fname, _ALIGNMENT_CACHE_TYPE, arrays,
+                 _get_source_attributes(read_alignment_file))
+
+def open_alignment_cache (cache_fname, read_alignment_file=None):
+    ''' Memory maps alignment columns stored with save_alignment_cache.
+        @return tuple(AlignmentColumns, extra arrays dict)
+        @raise BinaryFileError if the cache file is invalid or older
+        than the alignment file
+    '''
+    (arrays, attributes) = read_arrays(cache_fname, _ALIGNMENT_CACHE_TYPE)
+    if read_alignment_file is not None and \
+       attributes != _get_source_attributes(read_alignment_file):
+        raise BinaryFileError('Alignment cache %s is out of date.' % cache_fname)
+    extra_arrays = dict((name[len('extra_'):], array) for (name, array)
+                        in arrays.items() if name.startswith('extra_'))
+    return (AlignmentColumns.from_arrays(arrays), extra_arrays)
+
+def load_alignment_columns (read_alignment_file, workers=1, cache_fname=None):
+    ''' Returns alignment columns of the alignment file. If a cache
+        file name is given, columns are memory mapped from the cache when
+        it is up to date, otherwise the file is parsed and the cache is
+        (re)written.
+        @return AlignmentColumns
+    '''
+    if cache_fname is not None and os.path.exists(cache_fname):
+        try:
+            return open_alignment_cache(cache_fname, read_alignment_file)[0]
+        except BinaryFileError:
+            pass
+    columns = parse_alignment_file_parallel(read_alignment_file, workers)
+    if cache_fname is not None:
+        save_alignment_cache(columns, cache_fname, read_alignment_file)
+    return columns
+
+def split_file_ranges (fname, parts):
+    ''' Splits the file into at most parts byte ranges of similar size.
+        Every range starts at the beginning of a line and ends right
+        after a newline (or at the end of the file).
+        @return [(start, end)] list of byte ranges
+    '''
+    file_size = os.path.getsize(fname)
+    boundaries = [0]
+    fhandle = open(fname, 'rb')
+    try:
+        for i in xrange(1, parts):
+            position = file_size * i // parts
+            if position <= boundaries[-1]:
+                continue
+            if position >= file_size:
+                break
+            # Move to the beginning of the next line, unless already there
+            fhandle.seek(position - 1)
+            fhandle.readline()
+            position = fhandle.tell()
+            if position > boundaries[-1] and position < file_size:
+                boundaries.append(position)
+    finally:
+        fhandle.close()
+    boundaries.append(file_size)
+    return zip(boundaries[:-1], boundaries[1:])
+
+def _parse_file_range (task):
+    ''' Worker function - parses lines within the byte range.
+        @param task tuple(file name, start, end, chunk_size)
+        @return AlignmentColumns
+    '''
+    (fname, start, end, chunk_size) = task
+    parts = []
+    lines = []
+    fhandle = open(fname, 'rb')
+    try:
+        fhandle.seek(start)
+        position = start
+        while position < end:
+            line = fhandle.readline()
+            if not line:
+                break
+            position += len(line)
+            lines.append(line)
+            if len(lines) >= chunk_size:
+                parts.append(parse_alignment_lines(lines))
+                lines = []
+    finally:
+        fhandle.close()
+    parts.append(parse_alignment_lines(lines))
+    return AlignmentColumns.concatenate(parts)
+
+def _parse_compressed_file_parallel (read_alignment_file, workers, chunk_size):
+    ''' Parses chunks of lines of a compressed file in worker processes.
+        At most 2 * workers chunks are waiting to be parsed at a time.
+        @return AlignmentColumns
+    '''
+    parts = []
+    pending = collections.deque()
+    pool = multiprocessing.Pool(workers)
+    try:
+        for lines in _iter_line_chunks(read_alignment_file, chunk_size):
+            pending.append(pool.apply_async(parse_alignment_lines, (lines,)))
+            if len(pending) >= 2 * workers:
+                parts.append(pending.popleft().get())
+        while pending:
+            parts.append(pending.popleft().get())
+    finally:
+        pool.close()
+        pool.join()
+    return AlignmentColumns.concatenate(parts)
+
+def _iter_line_chunks (read_alignment_file, chunk_size):
+    ''' Reads the (possibly compressed) file in lists of at most
+        chunk_size lines.
+    '''
+    aln_file = open_input(read_alignment_file)
+    try:
+        lines = []
+        for line in aln_file:
+            lines.append(line)
+            if len(lines) >= chunk_size:
+                yield lines
+                lines = []
+        if lines:
+            yield lines
+    finally:
+        aln_file.close()
+
+_ALIGNMENT_CACHE_TYPE = 'alignment columns'
+
+def _get_source_attributes (read_alignment_file):
+    if read_alignment_file is None:
+        return {}
+    stat = os.stat(read_alignment_file)
+    return {'source_size': stat.st_size, 'source_mtime': stat.st_mtime}
+
+def _to_numbers (values, dtype):
+    return numpy.array(values, dtype=str).astype(dtype)
+
+def _to_string_ids (values):
+    ''' Maps a list of strings to a list of unique strings and
+        an array of indexes into it.
+    '''
+    if not values:
+        return ([], numpy.zeros(0, dtype=numpy.int32))
+    (unique, ids) = numpy.unique(numpy.array(values, dtype=str), return_inverse=True)
+    return (unique.tolist(), ids.astype(numpy.int32))
+
+def _merge_string_ids (parts):
+    ''' Merges (strings, ids) pairs so that ids index a single
+        list of unique strings.
+    '''
+    strings = []
+    for (part_strings, part_ids) in parts:
+        strings.extend(part_strings)
+    (unique, remap) = _to_string_ids(strings)
+    ids = []
+    start = 0
+    for (part_strings, part_ids) in parts:
+        ids.append(remap[start:start + len(part_strings)][part_ids])
+        start += len(part_strings)
+    return (unique, numpy.concatenate(ids))
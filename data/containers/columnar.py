@@ -0,0 +1,219 @@
+from data.containers.read import ReadContainer
+from data.columns import parse_alignment_file_parallel
+from data.columns import save_alignment_cache, open_alignment_cache
+
+import numpy
+
+class ColumnarReadContainer (ReadContainer):
+    ''' Read container backed by alignment columns (see data.columns).
+        The alignment file is parsed in bulk and the reads are kept as
+        numpy columns. Queries which can be answered from the columns
+        (read count, versions, tax IDs) do not create Read objects.
+        Read objects are created, and from then on used instead of the
+        columns, the first time they are requested.
+    '''
+
+    def __init__(self):
+        '''
+        (AlignmentColumns) columns Parsed alignment columns, None once
+        the reads have been turned into Read objects.
+        (numpy.int64 array) renamed_reads Reads which got the '#2' suffix.
+        (numpy.bool_ array) active_reads False for reads replaced by a
+        later read with the same id.
+        (numpy.int64 array) tax_ids Tax ID of each alignment row.
+        '''
+        self.columns = None
+        self.renamed_reads = None
+        self.active_reads = None
+        self.tax_ids = None
+        self._read_index = None
+        ReadContainer.__init__(self)
+
+    @property
+    def read_repository (self):
+        if self._read_repository is None:
+            self._materialize_reads()
+        return self._read_repository
+
+    @read_repository.setter
+    def read_repository (self, read_repository):
+        self._read_repository = read_repository
+        self.columns = None
+        self.renamed_reads = None
+        self.active_reads = None
+        self.tax_ids = None
+        self._read_index = None
+
+    @property
+    def read_index (self):
+        ''' Dictionary mapping read id to the read position in columns.
+            Created on first access.
+        '''
+        if self._read_index is None:
+            read_index = {}
+            renamed = set(self.renamed_reads.tolist())
+            read_ids = self.columns.read_ids
+            for i in numpy.flatnonzero(self.active_reads).tolist():
+                read_id = read_ids[i]
+                if i in renamed:
+                    read_id = read_id + '#2'
+                read_index[read_id] = i
+            self._read_index = read_index
+        return self._read_index
+
+    def is_columnar (self):
+        ''' Returns True if reads are still stored only as columns.
+        '''
+        return self.columns is not None
+
+    def load_alignment_data (self, read_alignment_file, workers=1, cache_fname=None):
+        ''' Parses the alignment file into columns.
+            Replaces any previously loaded reads.
+            @param workers (int) number of processes parsing the file
+            @param cache_fname path to the binary alignment cache. If the
+            cache is up to date, columns are memory mapped from it instead
+            of parsing the alignment file, otherwise the cache is written.
+        '''
+        if cache_fname is not None:
+            try:
+                self.load_alignment_cache(cache_fname, read_alignment_file)
+                return
+            except (IOError, ValueError):
+                pass
+        self.set_columns(parse_alignment_file_parallel(read_alignment_file, workers))
+        if cache_fname is not None:
+            self.save_alignment_cache(cache_fname, read_alignment_file)
+
+    def save_alignment_cache (self, cache_fname, read_alignment_file=None):
+        ''' Writes the columns of this container into a binary cache file
+            (see data.columns.save_alignment_cache).
+        '''
+        if not self.is_columnar():
+            raise ValueError('Reads are no longer stored as columns, cannot write alignment cache.')
+        extra_arrays = {'renamed_reads': self.renamed_reads,
+                        'active_reads' : self.active_reads}
+        if self.tax_ids is not None:
+            extra_arrays['tax_ids'] = self.tax_ids
+        save_alignment_cache(self.columns, cache_fname, read_alignment_file, extra_arrays)
+
+    def load_alignment_cache (self, cache_fname, read_alignment_file=None):
+        ''' Memory maps the columns from a binary cache file written by
+            save_alignment_cache. Replaces any previously loaded reads.
+            @raise BinaryFileError if the cache is invalid or out of date
+        '''
+        (columns, extra_arrays) = open_alignment_cache(cache_fname, read_alignment_file)
+        if not extra_arrays.has_key('renamed_reads'):
+            # written by ReadContainer, duplicate ids are not resolved yet
+            self.set_columns(columns)
+            return
+        self._read_repository = None
+        self.columns = columns
+        self.renamed_reads = extra_arrays['renamed_reads']
+        self.active_reads = extra_arrays['active_reads']
+        self.tax_ids = extra_arrays.get('tax_ids')
+        self._read_index = None
+
+    def set_columns (self, columns):
+        ''' Sets the alignment columns as the content of this container.
+            Duplicate read ids get the '#2' suffix (paired reads hack),
+            the same as with ReadContainer.
+            @param columns (AlignmentColumns)
+        '''
+        read_index = {}
+        renamed_reads = []
+        for (i, read_id) in enumerate(columns.read_ids):
+            if read_index.has_key(read_id):
+                read_id = read_id + '#2'
+                renamed_reads.append(i)
+            read_index[read_id] = i
+        active_reads = numpy.zeros(columns.get_read_count(), dtype=bool)
+        active_reads[read_index.values()] = True
+
+        self._read_repository = None
+        self.columns = columns
+        self.renamed_reads = numpy.array(renamed_reads, dtype=numpy.int64)
+        self.active_reads = active_reads
+        self.tax_ids = None
+        self._read_index = None
+
+    def set_taxids (self, data_access):
+        if not self.is_columnar():
+            return ReadContainer.set_taxids(self, data_access)
+        rows = self._get_active_rows()
+        (gis, gi_index) = numpy.unique(self.columns.genome_index[rows],
+                                       return_inverse=True)
+        gis = gis.tolist()
+        taxids = data_access.get_taxids(list(gis), format=dict)
+        taxid_lookup = numpy.array([taxids.get(gi, self.NO_TAXID) for gi in gis],
+                                   dtype=numpy.int64)
+        self.tax_ids = numpy.zeros(self.columns.get_alignment_count(), dtype=numpy.int64)
+        self.tax_ids[rows] = taxid_lookup[gi_index]
+
+    def fetch_all_reads_versions (self):
+        '''
+        Returns an iterator returning all versions of all reads in this
+        container
+
+        .. note::
+            While reads are stored as columns, every version is
+            returned only once.
+
+        :returns: iterator returning versions of reads
+        '''
+        if not self.is_columnar():
+            return ReadContainer.fetch_all_reads_versions(self)
+        accession_ids = numpy.unique(self.columns.accession_id[self._get_active_rows()])
+        accessions = self.columns.accessions
+        return (accessions[i] for i in accession_ids.tolist())
+
+    def get_taxid_arrays (self):
+        if not self.is_columnar():
+            return ReadContainer.get_taxid_arrays(self)
+        # alignments of reads replaced by a duplicate read id are dropped
+        read_items = sorted(self.read_index.items(), key=lambda item: item[1])
+        read_nums = numpy.array([read_num for (read_id, read_num) in read_items], dtype=numpy.int64)
+        offsets = self.columns.offsets
+        counts = offsets[read_nums + 1] - offsets[read_nums]
+        new_offsets = numpy.zeros(len(read_nums) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=new_offsets[1:])
+        rows = self._get_active_rows()
+        if self.tax_ids is None:
+            tax_ids = numpy.zeros(new_offsets[-1], dtype=numpy.int64)
+        else:
+            tax_ids = self.tax_ids[rows]
+        read_ids = [read_id for (read_id, read_num) in read_items]
+        return (read_ids, new_offsets, tax_ids, self.columns.score[rows])
+
+    def get_read_count (self):
+        if self.is_columnar():
+            return int(numpy.count_nonzero(self.active_reads))
+        return ReadContainer.get_read_count(self)
+
+    def _get_active_rows (self):
+        ''' Returns alignment rows of reads present in the container
+            (rows of reads replaced by a duplicate read id are skipped).
+        '''
+        if numpy.all(self.active_reads):
+            return slice(None)
+        return self.active_reads[self.columns.get_read_index()]
+
+    def _materialize_reads (self):
+        ''' Creates Read objects from the columns.
+            Columns are released afterwards.
+        '''
+        columns = self.columns
+        tax_ids = self.tax_ids
+        read_repository = {}
+        if columns is not None:
+            read_items = sorted(self.read_index.items(), key=lambda item: item[1])
+            read_nums = [read_num for (read_id, read_num) in read_items]
+            for ((read_id, read_num), read) in zip(read_items, columns.to_reads(read_nums)):
+                read.id = read_id
+                if tax_ids is not None:
+                    row = columns.offsets[read_num]
+                    for alignment in read.get_alignments(format=iter):
+                        taxid = int(tax_ids[row])
+                        alignment.tax_id = None if taxid == self.NO_TAXID else taxid
+                        row += 1
+                read_repository[read_id] = read
+        self.read_repository = read_repository
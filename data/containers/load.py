@@ -1,26 +1,90 @@
 from data.containers.read   import ReadContainer
-from data.containers.record import RecordContainer
+from data.containers.table  import TableReadContainer
+from data.containers.record import RecordContainer, RecordPrefetcher
 from data.containers.cdsaln import CdsAlnContainer
 from ncbi.db.mock_db_access import MockDbQuery
 
-def fill_containers (alignment_file, db_access):
+def fill_containers (alignment_file, db_access, prefetch_workers=None,
+                     max_in_flight=None, chunk_size=100000):
     '''
     Populates read, record and CDS alignment container.
+    Reads are kept in a TableReadContainer, unless records are
+    prefetched while parsing (reads are then collected from the
+    streamed chunks into a ReadContainer).
+    @param prefetch_workers (int) if set, records are fetched by this
+    many threads while the alignment file is being parsed (see
+    RecordPrefetcher), otherwise after the whole file is loaded
+    @param max_in_flight (int) maximum number of record batches fetched
+    at a time when prefetching
+    @param chunk_size (int) number of reads parsed before their records
+    are scheduled for prefetching
     @return tuple(ReadContainer, RecordContainer, CdsAlnContainer)
     '''
 
-    read_cont   = ReadContainer()
     record_cont = RecordContainer()
     record_cont.set_db_access(db_access)
     cdsaln_cont = CdsAlnContainer()
 
-#   1. Load all the information available in the alignment file
-    read_cont.populate_from_aln_file(alignment_file)
-#   2. Fetch all the records reported in the alignment file from the database
-    record_cont.populate(read_cont.fetch_all_reads_versions())
+    if prefetch_workers:
+#       1. + 2. Load the alignment file, fetching its records in the background
+        read_cont = ReadContainer()
+        prefetcher = RecordPrefetcher(record_cont, workers=prefetch_workers,
+                                      max_in_flight=max_in_flight)
+        for chunk in ReadContainer.iter_alignment_chunks(alignment_file, chunk_size):
+            read_cont.read_repository.update(chunk.read_repository)
+            prefetcher.add(chunk.fetch_all_reads_versions())
+        prefetcher.finish()
+    else:
+#       1. Load all the information available in the alignment file
+        read_cont = TableReadContainer()
+        read_cont.load_alignment_data(alignment_file)
+#       2. Fetch all the records reported in the alignment file from the database
+        record_cont.populate(read_cont.fetch_all_reads_versions())
 #   3. Find to which coding sequences reads map
     read_cont.populate_cdss(record_cont)
 #   4. Populate Cds Alignment container
     cdsaln_cont.populate(read_cont.fetch_all_reads())
 
     return (read_cont, record_cont, cdsaln_cont)
+
+def fill_containers_streaming (alignment_file, db_access, chunk_size=100000, read_filter=None,
+                               tables=('cds',), prefetch_workers=None, max_in_flight=None):
+    '''
+    Populates record and CDS alignment container without holding all
+    the reads from the alignment file in memory.
+    Reads are loaded in chunks of at most chunk_size reads (see
+    ReadContainer.iter_alignment_chunks). Each chunk gets its tax IDs
+    set, is passed through read_filter (if given) and is discarded once
+    its CDS alignments have been recorded.
+    @param read_filter function taking and returning a list of reads,
+    e.g. host read filtering
+    @param tables list of tables the records are fetched from, in
+    order (see RecordContainer.populate)
+    @param prefetch_workers (int) if set, records of each chunk are
+    fetched by this many threads (see RecordPrefetcher)
+    @param max_in_flight (int) maximum number of record batches fetched
+    at a time by the threads
+    @return tuple(RecordContainer, CdsAlnContainer, total read count)
+    '''
+
+    record_cont = RecordContainer()
+    record_cont.set_db_access(db_access)
+    cdsaln_cont = CdsAlnContainer()
+    read_count  = 0
+
+    for read_cont in ReadContainer.iter_alignment_chunks(alignment_file, chunk_size):
+        read_count += read_cont.get_read_count()
+#       1. Set tax IDs and filter reads of the current chunk
+        read_cont.set_taxids(db_access)
+        if read_filter is not None:
+            read_cont.set_new_reads(read_filter(read_cont.fetch_all_reads(format=list)))
+#       2. Fetch records reported in this chunk (already fetched ones are kept)
+        for table in tables:
+            record_cont.populate(read_cont.fetch_all_reads_versions(), table=table,
+                                 workers=prefetch_workers, max_in_flight=max_in_flight)
+#       3. Find to which coding sequences reads map
+        read_cont.populate_cdss(record_cont)
+#       4. Add chunk to the Cds Alignment container
+        cdsaln_cont.populate(read_cont.fetch_all_reads())
+
+    return (record_cont, cdsaln_cont, read_count)
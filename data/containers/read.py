@@ -1,26 +1,116 @@
 from data.read import Read
+from data.columns import load_alignment_columns
 from utils.location import Location
+from utils.symbols import SymbolTable
+from utils.compressed import open_input
+from formats.blast2input import BLASTParser
 
 import time
+import numpy
 
 class ReadContainer (object):
     ''' Contains all the reads loaded from an
         alignment file. Can be queried by read id.
     '''
+    # Tax ID used in tax ID arrays for alignments without a tax ID
+    NO_TAXID = 0
+
     def __init__(self):
         """
         (dict) read_repository Dictionary where value is (Read)read and key is (str)read id.
+        (SymbolTable) accessions Nucleotide accessions of the alignments in
+        this container, every distinct accession string is kept only once.
         """
         self.read_repository = {}
+        self.accessions = SymbolTable()
 
-    def load_alignment_data (self, read_alignment_file):
+    def load_alignment_data (self, read_alignment_file, workers=1, cache_fname=None):
         ''' Adds all the reads in the alignment file to the
             read repository.
             This is the first stage of filling the read container.
+            Compressed alignment files are supported (see utils.compressed).
+            @param workers (int) number of processes parsing the file.
+            If larger than 1, the file is split into byte ranges which
+            are parsed in parallel (see data.columns).
+            @param cache_fname path to the binary alignment cache. If the
+            cache is up to date, reads are loaded from it instead of
+            parsing the alignment file, otherwise the cache is written.
         '''
-        aln_file = open(read_alignment_file, 'r')
-        for line in aln_file.readlines():
+        if workers > 1 or cache_fname is not None:
+            columns = load_alignment_columns(read_alignment_file, workers, cache_fname)
+            for read in columns.to_reads():
+                self._add_read(read)
+            return
+        aln_file = open_input(read_alignment_file)
+        for line in aln_file:
             self._add_read_from_str(line)
+        aln_file.close()
+
+    def populate_from_bam (self, bam_fname, workers=1):
+        ''' Adds all the reads from a SAM/BAM file to the read
+            repository, without converting it to the alignment (.in)
+            format first (see formats.sam2input.SamParser).
+            @param workers (int) number of processes reading the file.
+            Used only if the BAM file is indexed, regions of the
+            references are then read in parallel (see
+            formats.sam2input.iter_reads_indexed).
+        '''
+        from formats.sam2input import SamParser, has_index, iter_reads_indexed
+        if workers > 1 and has_index(bam_fname):
+            reads = iter_reads_indexed(bam_fname, workers)
+        else:
+            reads = SamParser().iter_reads(bam_fname)
+        for read in reads:
+            self._add_read(read)
+
+    def populate_from_blast (self, blast_output_fname, output_format=None):
+        ''' Adds all the reads from a BLAST tabular output (outfmt 6/7,
+            also produced by DIAMOND) to the read repository, without
+            converting it to the alignment (.in) format first.
+            @param output_format (str) BLAST output format specification
+            (see formats.blast2input.BLASTParser)
+        '''
+        for read in BLASTParser(output_format).iter_reads(blast_output_fname):
+            self._add_read(read)
+
+    @staticmethod
+    def iter_alignment_chunks (read_alignment_file, chunk_size=100000):
+        ''' Streams the alignment file as a sequence of read containers,
+            each holding at most chunk_size reads.
+            Chunks can be passed through set_taxids, host filtering,
+            populate_cdss and CdsAlnContainer.populate one at a time, so
+            the whole sample never has to be held in memory.
+            Ids of all the reads loaded so far are remembered between
+            chunks, so that paired reads get the same '#2' suffix as with
+            load_alignment_data even if the mates end up in different
+            chunks. Tracking duplicates only within a chunk would give
+            both mates the same id, and CdsAlignment keeps a single
+            sublocation per read id, so CDS coverage would depend on the
+            chunk size. Only the id strings are kept, not the reads.
+            A read id occurring more than twice is not a pair: while
+            load_alignment_data replaces the earlier '#2' read with it,
+            here that read may be in an already yielded chunk, so both
+            are kept.
+
+            :param read_alignment_file path to the alignment (.in) file
+            :param chunk_size (int) maximum number of reads per chunk
+            :rtype generator of ReadContainer
+        '''
+        if chunk_size < 1:
+            raise ValueError('Chunk size must be positive, got %d.' % chunk_size)
+        seen_read_ids = set()
+        chunk = ReadContainer()
+        aln_file = open_input(read_alignment_file)
+        try:
+            for line in aln_file:
+                chunk._add_read_from_str(line, seen_read_ids)
+                if chunk.get_read_count() >= chunk_size:
+                    yield chunk
+                    chunk = ReadContainer()
+        finally:
+            aln_file.close()
+        if chunk.get_read_count():
+            yield chunk
 
     def set_taxids (self, data_access):
         gis = set()
@@ -37,6 +127,32 @@ class ReadContainer (object):
             for alignment in read.get_alignments():
                 alignment.tax_id = taxids.get(alignment.genome_index, None)
 
+    def get_taxid_arrays (self):
+        '''
+        Returns tax IDs and scores of the alignments of all the reads
+        in CSR layout (see TaxTree.batch_lca): tax IDs of the i-th read
+        are tax_ids[offsets[i]:offsets[i+1]].
+
+        :rtype tuple(read_ids:[str], offsets:numpy.int64 array,
+        tax_ids:numpy.int64 array, scores:numpy.float64 array),
+        NO_TAXID for alignments without a tax ID
+        '''
+        read_ids = []
+        counts = []
+        tax_ids = []
+        scores = []
+        for read in self.fetch_all_reads(format=iter):
+            alignments = read.get_alignments()
+            read_ids.append(read.id)
+            counts.append(len(alignments))
+            for alignment in alignments:
+                tax_ids.append(self.NO_TAXID if alignment.tax_id is None else alignment.tax_id)
+                scores.append(alignment.score)
+        offsets = numpy.zeros(len(counts) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=offsets[1:])
+        return (read_ids, offsets, numpy.array(tax_ids, dtype=numpy.int64),
+                numpy.array(scores, dtype=numpy.float64))
+
     def get_protein_ids(self, exclude_host=False):
         protein_ids = set([])
         for read in self.read_repository.values():
@@ -90,14 +206,31 @@ class ReadContainer (object):
         for read in new_reads:
             self.read_repository[read.id] = read
 
-    def _add_read_from_str (self, read_str):
-        read = Read.from_read_str(read_str)
+    def _add_read_from_str (self, read_str, seen_read_ids=None):
+        ''' Parses the read string and adds the read to the
+            repository (see _add_read).
+        '''
+        self._add_read(Read.from_read_str(read_str), seen_read_ids)
 
+    def _add_read (self, read, seen_read_ids=None):
+        ''' Adds the read to the repository.
+            @param seen_read_ids (set) read ids loaded so far, if reads
+            are being loaded over several containers. Defaults to the
+            ids in this container.
+        '''
         # assert (not self.read_repository.has_key(read.id)) # Make sure that this read is not already loaded
         # Paired reads hack
-        if self.read_repository.has_key(read.id):
-            read.id = read.id + '#2'
+        if seen_read_ids is None:
+            if self.read_repository.has_key(read.id):
+                read.id = read.id + '#2'
+        else:
+            if read.id in seen_read_ids:
+                read.id = read.id + '#2'
+            seen_read_ids.add(read.id)
 
+        canonical = self.accessions.canonical
+        for alignment in read.get_alignments(format=iter):
+            alignment.nucleotide_accession = canonical(alignment.nucleotide_accession)
         self.read_repository[read.id] = read
 
     def get_read_count(self):
@@ -1,5 +1,7 @@
 
+import collections
 import logging
+from multiprocessing.pool import ThreadPool
 from ncbi.db.access import WrongTableError, DbQuery
 
 class RecordContainer (object):
@@ -7,11 +9,14 @@ class RecordContainer (object):
         If a GenBank/EMBL/DDBJ record has already been
         fetched from the database, it can be fetched localy
         from the record repository.
+        If a record cache is set, records are looked up in it before
+        going to the database, and fetched records are added to it.
     '''
 
     def __init__ (self):
         self.record_repository  = {}
         self.num_missing_records = 0
+        self.record_cache = None
         self.log = logging.getLogger(__name__)
 
     def get_num_missing_records_stats(self):
@@ -29,18 +34,62 @@ class RecordContainer (object):
         assert (hasattr(db_query, 'get_record'))
         self.db_query = db_query
 
-    def populate (self, versions, table='cds'):
+    def set_record_cache(self, record_cache):
+        '''
+        @param: record_cache (RecordCache) persistent record cache
+        (see ncbi.db.record_cache), None to disable caching
+        '''
+        self.record_cache = record_cache
+
+    def populate (self, versions, table='cds', batch_size=None,
+                  workers=None, max_in_flight=None):
         '''
         Populates the record container with all the records
-        that have produced significant alignments
+        that have produced significant alignments.
+        Versions can repeat, each record is fetched only once. If the
+        database access supports it, records not found in the record
+        cache are fetched in batches (see DbQuery.get_records).
 
         :param list of NT (GenBank, EMBL, DDBJ) accession.versions
         :param table (str) available tables are cds, rrna, mrna, misc_rna
+        :param batch_size (int) number of records fetched with a single
+        query, defaults to DbQuery.RECORD_BATCH_SIZE
+        :param workers (int) if larger than 1, batches are fetched by
+        this many threads at a time (see RecordPrefetcher)
+        :param max_in_flight (int) maximum number of batches fetched at
+        a time by the threads, defaults to 2 * workers
         '''
         if table not in DbQuery.supported_tables:
             raise WrongTableError(table)
+        self._check_db_access()
+        if workers > 1 and hasattr(self.db_query, 'get_records'):
+            prefetcher = RecordPrefetcher(self, table, workers, max_in_flight, batch_size)
+            prefetcher.add(versions)
+            prefetcher.finish()
+            return
+        if not hasattr(self.db_query, 'get_records'):
+            for version in versions:
+                self.fetch_record(version)
+            return
+
+        new_versions = []
+        seen = set()
         for version in versions:
-            self.fetch_record(version)
+            if version in seen or self.record_repository.has_key(version):
+                continue
+            seen.add(version)
+            new_versions.append(version)
+        if not new_versions:
+            return
+
+        records = self._get_cached_records(new_versions, table)
+        uncached = [version for version in new_versions if version not in records]
+        if uncached:
+            fetched = self.db_query.get_records(uncached, table, batch_size)
+            self._cache_records(uncached, fetched, table)
+            records.update(fetched)
+        for version in new_versions:
+            self._store_record(version, records.get(version))
 
     def fetch_record (self, nucleotide_accession):
         '''
@@ -70,16 +119,167 @@ class RecordContainer (object):
         ''' Adds the record from database if not already present
 	   If unable to find entry in database, stores None instead.
         '''
+        self._check_db_access()
+        if not self.record_repository.has_key(record_id):
+            records = self._get_cached_records([record_id], 'cds')
+            if records.has_key(record_id):
+                record = records[record_id]
+            else:
+                record = self.db_query.get_record(record_id) # What is type of this object?
+                self._cache_records([record_id], {record_id: record}, 'cds')
+            self._store_record(record_id, record)
+
+    def _store_record (self, record_id, record):
+        ''' Stores the fetched record, or None if the record has
+            not been found.
+            @param record_id (str) accession.version
+        '''
+        try :
+            getattr(record, 'version')
+            self.record_repository[record_id] = record
+        except AttributeError:
+            self.log.info("No record with ID %s", str(record_id))
+            self.record_repository[record_id] = None
+            self.num_missing_records += 1
+
+    def _get_cached_records (self, versions, table):
+        ''' Looks up the records in the record cache.
+            @return dict(key=accession.version, value=UnityRecord or None
+            for missing records), versions not in the cache are left out
+        '''
+        if self.record_cache is None:
+            return {}
+        return self.record_cache.get_records(versions, table)
+
+    def _cache_records (self, versions, records, table):
+        ''' Adds the fetched records to the record cache, versions without
+            a record are cached as missing.
+            @param records dict(key=accession.version, value=record)
+        '''
+        if self.record_cache is None:
+            return
+        cached = {}
+        for version in versions:
+            record = records.get(version)
+            cached[version] = record if hasattr(record, 'version') else None
+        self.record_cache.put_records(cached, table)
+
+    def _check_db_access (self):
         try:
             getattr(self, 'db_query')
         except AttributeError:
             raise AttributeError("RecordContainer has not attribute 'db_query'. Did you forget to envoke set_db_access()?")
-        if not self.record_repository.has_key(record_id):
-            record = self.db_query.get_record(record_id) # What is type of this object?
-            try :
-                getattr(record, 'version')
-                self.record_repository[record_id] = record
-            except AttributeError:
-                self.log.info("No record with ID %s", str(record_id))
-                self.record_repository[record_id] = None
-                self.num_missing_records += 1
+
+
+class RecordPrefetcher (object):
+    ''' Fetches records of a record container in the background,
+        e.g. while the alignment file is still being parsed, so that
+        they are ready by the time the reads are mapped to CDSs.
+        Added versions are collected into batches, which are fetched
+        by a pool of threads over their own pool of database
+        connections (see DbQuery.create_pooled), skipping records found
+        in the record cache of the container. When max_in_flight
+        batches are being fetched, adding another one waits for the
+        oldest one. Fetched records are stored in the container by the
+        calling thread, the container is complete after finish().
+        If the database access can not fetch records in batches (e.g.
+        MockDbQuery), added records are fetched one by one by the
+        calling thread instead (see RecordContainer.populate).
+    '''
+
+    def __init__ (self, record_container, table='cds', workers=4,
+                  max_in_flight=None, batch_size=None):
+        '''
+        @param record_container (RecordContainer) container with the
+        database access (DbQuery, DataAccess) set
+        @param table (str) available tables are cds, rrna, mrna, misc_rna
+        @param workers (int) number of threads (and database connections)
+        @param max_in_flight (int) maximum number of batches fetched at
+        a time, defaults to 2 * workers
+        @param batch_size (int) number of records fetched with a single
+        query, defaults to DbQuery.RECORD_BATCH_SIZE
+        '''
+        if table not in DbQuery.supported_tables:
+            raise WrongTableError(table)
+        if workers < 1:
+            raise ValueError('Number of workers must be positive, got %d.' % workers)
+        record_container._check_db_access()
+        db_query = record_container.db_query
+        if hasattr(db_query, 'get_records'):
+            if hasattr(db_query, 'create_pooled'):
+                db_query = db_query.create_pooled(workers)
+            pool = ThreadPool(workers)
+        else:
+            pool = None
+
+        self.record_container    = record_container
+        self.db_query           = db_query
+        self.table              = table
+        self.max_in_flight      = max_in_flight or 2 * workers
+        self.batch_size         = batch_size or DbQuery.RECORD_BATCH_SIZE
+        self.pool               = pool
+        self.pending            = collections.deque()
+        self.batch              = []
+        self.requested          = set()
+
+    def add (self, versions):
+        '''
+        Schedules fetching of the records. Versions can repeat, records
+        already in the container or already scheduled are skipped.
+        @param versions list of NT accession.versions
+        '''
+        repository = self.record_container.record_repository
+        for version in versions:
+            if version in self.requested or repository.has_key(version):
+                continue
+            self.requested.add(version)
+            self.batch.append(version)
+            if len(self.batch) >= self.batch_size:
+                self._dispatch()
+
+    def finish (self):
+        '''
+        Fetches the remaining records and waits for all the batches.
+        The prefetcher can not be used afterwards.
+        '''
+        try:
+            if self.batch:
+                self._dispatch()
+            while self.pending:
+                self._store_oldest()
+        finally:
+            if self.pool is not None:
+                self.pool.terminate()
+
+    def _dispatch (self):
+        ''' Stores records of the current batch found in the record
+            cache and starts fetching the rest.
+        '''
+        batch = self.batch
+        self.batch = []
+        if self.pool is None:
+            self.record_container.populate(batch, self.table)
+            return
+        cached = self.record_container._get_cached_records(batch, self.table)
+        uncached = []
+        for version in batch:
+            if cached.has_key(version):
+                self.record_container._store_record(version, cached[version])
+            else:
+                uncached.append(version)
+        if not uncached:
+            return
+
+        while len(self.pending) >= self.max_in_flight:
+            self._store_oldest()
+        self.pending.append((uncached, self.pool.apply_async(
+            self.db_query.get_records, (uncached, self.table, len(uncached)))))
+
+    def _store_oldest (self):
+        ''' Waits for the oldest batch and stores its records.
+        '''
+        (batch, result) = self.pending.popleft()
+        records = result.get()
+        self.record_container._cache_records(batch, records, self.table)
+        for version in batch:
+            self.record_container._store_record(version, records.get(version))
@@ -0,0 +1,83 @@
+from data.containers.columnar import ColumnarReadContainer
+from data.table import AlignmentTable, TableRead
+
+import numpy
+
+class TableReadContainer (ColumnarReadContainer):
+    ''' Read container which keeps the reads in an AlignmentTable
+        (see data.table) instead of creating Read and ReadAlnLocation
+        objects. Reads are returned as TableRead views, so existing
+        callers (host filtering, populate_cdss, CdsAlnContainer, binners)
+        work unchanged, while a sample takes several times less memory.
+    '''
+
+    def __init__(self):
+        '''
+        (AlignmentTable) table Reads and alignments of this container,
+        created from the columns the first time reads are requested.
+        '''
+        self.table = None
+        ColumnarReadContainer.__init__(self)
+
+    def load_alignment_cache (self, cache_fname, read_alignment_file=None):
+        self.table = None
+        ColumnarReadContainer.load_alignment_cache(self, cache_fname, read_alignment_file)
+
+    def set_columns (self, columns):
+        self.table = None
+        ColumnarReadContainer.set_columns(self, columns)
+
+    def set_taxids (self, data_access):
+        if self.is_columnar() or self.table is None:
+            return ColumnarReadContainer.set_taxids(self, data_access)
+        self.table.set_taxids(data_access)
+
+    def fetch_all_reads_versions (self):
+        '''
+        Returns an iterator returning all versions of all reads in this
+        container
+
+        .. note::
+            Every version is returned only once.
+
+        :returns: iterator returning versions of reads
+        '''
+        if self.is_columnar() or self.table is None:
+            return ColumnarReadContainer.fetch_all_reads_versions(self)
+        reads = self.fetch_all_reads(format=list)
+        if not all(isinstance(read, TableRead) and read.table is self.table for read in reads):
+            # reads were replaced by set_new_reads
+            return ColumnarReadContainer.fetch_all_reads_versions(self)
+        read_nums = numpy.array([read.read_num for read in reads], dtype=numpy.int64)
+        accessions = self.table.accessions
+        return (accessions[i] for i in self.table.get_accession_ids(read_nums).tolist())
+
+    def get_taxid_arrays (self):
+        if self.is_columnar() or self.table is None:
+            return ColumnarReadContainer.get_taxid_arrays(self)
+        reads = self.fetch_all_reads(format=list)
+        if not all(isinstance(read, TableRead) and read.table is self.table for read in reads):
+            # reads were replaced by set_new_reads
+            return ColumnarReadContainer.get_taxid_arrays(self)
+        reads.sort(key=lambda read: read.read_num)
+        read_nums = numpy.array([read.read_num for read in reads], dtype=numpy.int64)
+        (offsets, tax_ids, scores) = self.table.get_taxid_arrays(read_nums)
+        return ([read.id for read in reads], offsets, tax_ids, scores)
+
+    def _materialize_reads (self):
+        ''' Creates the alignment table from the columns and fills
+            the read repository with its read views.
+            Columns are released afterwards.
+        '''
+        columns = self.columns
+        read_repository = {}
+        if columns is not None:
+            read_items = sorted(self.read_index.items(), key=lambda item: item[1])
+            read_ids = [read_id for (read_id, read_num) in read_items]
+            read_nums = numpy.array([read_num for (read_id, read_num) in read_items], dtype=numpy.int64)
+            renamed = numpy.in1d(read_nums, self.renamed_reads)
+            self.table = AlignmentTable.from_columns(columns, read_nums, read_ids,
+                                                     renamed, self.tax_ids)
+            for (i, read_id) in enumerate(read_ids):
+                read_repository[read_id] = self.table.get_read(i)
+        self.read_repository = read_repository
@@ -0,0 +1,369 @@
+from data.alignment import AlignedCdsMixin
+
+import numpy
+
+# Tri-state (None, False, True) flags are stored as int8
+_UNDECIDED = -1
+
+def _to_flag (value):
+    return _UNDECIDED if value is None else int(bool(value))
+
+def _from_flag (flag):
+    return None if flag == _UNDECIDED else bool(flag)
+
+
+class AlignmentTable (object):
+    ''' Stores all the reads of a sample and their alignments in numpy
+        structured arrays (one record per read and one per alignment).
+        Alignments of the i-th read are rows offsets[i]:offsets[i+1] of
+        the alignment array, unless some of them have been removed with
+        TableRead.set_alignments.
+        Read ids and nucleotide accessions are kept in lists owned by the
+        table, so they are released together with it.
+        TableRead and TableAlignment are lightweight views exposing the
+        Read and ReadAlnLocation interface, created on access.
+    '''
+
+    READ_DTYPE = numpy.dtype([
+        ('renamed',         numpy.bool_),   # id got the '#2' suffix
+        ('potential_host',  numpy.int8),
+        ('status',          numpy.int16),   # see filters.readprocessing
+    ])
+
+    ALIGNMENT_DTYPE = numpy.dtype([
+        ('accession_id',    numpy.int32),   # index into accessions
+        ('db_source_id',    numpy.int32),
+        ('genome_index',    numpy.int64),
+        ('score',           numpy.float64),
+        ('start',           numpy.int64),
+        ('stop',            numpy.int64),
+        ('tax_id',          numpy.int64),
+        ('complement',      numpy.bool_),
+        ('active',          numpy.bool_),
+        ('potential_host',  numpy.int8),
+    ])
+
+    # Tax ID stored for alignments without one
+    NO_TAXID = 0
+
+    def __init__ (self, reads, read_ids, offsets, alignments, accessions, db_sources):
+        '''
+        @param reads        (numpy array of READ_DTYPE)
+        @param read_ids     ([str]) id of each read
+        @param offsets      (numpy.int64 array) len(reads) + 1 row offsets
+        @param alignments   (numpy array of ALIGNMENT_DTYPE)
+        @param accessions   ([str]) nucleotide accessions referenced by accession_id
+        @param db_sources   ([str]) database sources referenced by db_source_id
+        (dict) read_rows Alignment rows of reads whose alignments were changed
+        with TableRead.set_alignments, key is read number.
+        (dict) aligned_cdss Aligned CDSs of each alignment row
+        (see ReadAlnLocation.determine_coding_seqs).
+        '''
+        self.reads          = reads
+        self.read_ids       = read_ids
+        self.offsets        = offsets
+        self.alignments     = alignments
+        self.accessions     = accessions
+        self.db_sources     = db_sources
+        self.read_rows      = {}
+        self.aligned_cdss   = {}
+        self.read_fields    = dict((name, reads[name]) for name in reads.dtype.names)
+        self.fields         = dict((name, alignments[name]) for name in alignments.dtype.names)
+
+    @staticmethod
+    def from_columns (columns, read_nums, read_ids, renamed, tax_ids=None):
+        ''' Creates the table from a subset of alignment columns.
+            @param columns      (AlignmentColumns)
+            @param read_nums    (array of int) reads to copy, in table order
+            @param read_ids     ([str]) id of each copied read
+            @param renamed      (array of bool) True for reads whose id got
+                                the '#2' suffix
+            @param tax_ids      (numpy.int64 array) tax ID of each alignment
+                                row in columns, NO_TAXID if not resolved
+            @return AlignmentTable
+        '''
+        read_nums = numpy.asarray(read_nums, dtype=numpy.int64)
+        reads = numpy.zeros(len(read_nums), dtype=AlignmentTable.READ_DTYPE)
+        reads['renamed'] = renamed
+        reads['potential_host'] = _UNDECIDED
+
+        counts = numpy.diff(columns.offsets)[read_nums]
+        offsets = numpy.zeros(len(read_nums) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=offsets[1:])
+        # source row of every table row
+        rows = numpy.repeat(columns.offsets[:-1][read_nums] - offsets[:-1], counts) \
+               + numpy.arange(offsets[-1])
+
+        alignments = numpy.zeros(len(rows), dtype=AlignmentTable.ALIGNMENT_DTYPE)
+        for name in ('accession_id', 'db_source_id', 'genome_index', 'score',
+                     'start', 'stop', 'complement'):
+            alignments[name] = getattr(columns, name)[rows]
+        if tax_ids is not None:
+            alignments['tax_id'] = tax_ids[rows]
+        alignments['active'] = True
+        alignments['potential_host'] = _UNDECIDED
+        return AlignmentTable(reads, list(read_ids), offsets, alignments,
+                              list(columns.accessions), list(columns.db_sources))
+
+    def get_read_count (self):
+        return len(self.reads)
+
+    def get_alignment_count (self):
+        return len(self.alignments)
+
+    def get_read (self, read_num):
+        return TableRead(self, read_num)
+
+    def iter_reads (self):
+        for read_num in xrange(self.get_read_count()):
+            yield TableRead(self, read_num)
+
+    def get_rows (self, read_num):
+        ''' Returns alignment rows of the read.
+            @return list of int
+        '''
+        rows = self.read_rows.get(read_num)
+        if rows is None:
+            return range(self.offsets[read_num], self.offsets[read_num+1])
+        return rows
+
+    def set_rows (self, read_num, rows):
+        self.read_rows[read_num] = list(rows)
+
+    def get_read_index (self):
+        ''' Returns the read number of every alignment row.
+            @return (numpy.int64 array)
+        '''
+        return numpy.repeat(numpy.arange(self.get_read_count()),
+                            numpy.diff(self.offsets))
+
+    def get_row_mask (self):
+        ''' Returns False for alignment rows removed from their read
+            with TableRead.set_alignments.
+            @return (numpy.bool_ array)
+        '''
+        mask = numpy.ones(self.get_alignment_count(), dtype=bool)
+        for (read_num, rows) in self.read_rows.items():
+            mask[self.offsets[read_num]:self.offsets[read_num+1]] = False
+            mask[rows] = True
+        return mask
+
+    def set_taxids (self, data_access):
+        ''' Sets tax IDs of all alignments with a single query
+            per distinct GI.
+        '''
+        (gis, gi_index) = numpy.unique(self.fields['genome_index'], return_inverse=True)
+        gis = gis.tolist()
+        taxids = data_access.get_taxids(gis, format=dict)
+        taxid_lookup = numpy.array([taxids.get(gi, self.NO_TAXID) for gi in gis],
+                                   dtype=numpy.int64)
+        self.fields['tax_id'][:] = taxid_lookup[gi_index]
+
+    def get_taxid_arrays (self, read_nums):
+        ''' Returns tax IDs and scores of the alignments of the reads
+            in CSR layout (see TaxTree.batch_lca). Rows removed from
+            their read are left out.
+            @param read_nums (numpy.int64 array) sorted read numbers
+            @return tuple(offsets:numpy.int64 array,
+            tax_ids:numpy.int64 array, scores:numpy.float64 array)
+        '''
+        counts = self.offsets[read_nums + 1] - self.offsets[read_nums]
+        offsets = numpy.zeros(len(read_nums) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=offsets[1:])
+        rows = numpy.repeat(self.offsets[read_nums] - offsets[:-1], counts) + \
+               numpy.arange(offsets[-1], dtype=numpy.int64)
+        # drop removed rows and shift the offsets accordingly
+        kept = self.get_row_mask()[rows]
+        offsets = numpy.r_[0, numpy.cumsum(kept)][offsets]
+        rows = rows[kept]
+        return (offsets, self.fields['tax_id'][rows], self.fields['score'][rows])
+
+    def get_accession_ids (self, read_nums=None):
+        ''' Returns ids (positions in accessions) of all the accessions
+            referenced by alignments. Rows removed from their read are
+            left out.
+            @param read_nums (numpy.int64 array) if given, only
+            alignments of these reads are considered
+            @return (numpy.int32 array)
+        '''
+        mask = self.get_row_mask()
+        if read_nums is not None:
+            read_mask = numpy.zeros(self.get_read_count(), dtype=bool)
+            read_mask[read_nums] = True
+            mask &= numpy.repeat(read_mask, numpy.diff(self.offsets))
+        return numpy.unique(self.fields['accession_id'][mask])
+
+
+class TableRead (object):
+    ''' Read stored in an AlignmentTable.
+        Offers the same interface as data.read.Read.
+    '''
+    __slots__ = ('table', 'read_num')
+
+    def __init__ (self, table, read_num):
+        self.table      = table
+        self.read_num   = read_num
+
+    @property
+    def id (self):
+        return self.table.read_ids[self.read_num]
+
+    @property
+    def length (self):
+        return None
+
+    @property
+    def potential_host (self):
+        return _from_flag(self.table.read_fields['potential_host'][self.read_num])
+
+    @potential_host.setter
+    def potential_host (self, potential_host):
+        self.table.read_fields['potential_host'][self.read_num] = _to_flag(potential_host)
+
+    def is_host (self):
+        return self.potential_host
+
+    @property
+    def status (self):
+        return int(self.table.read_fields['status'][self.read_num])
+
+    def set_status (self, status):
+        self.table.read_fields['status'][self.read_num] = status
+
+    @property
+    def alignment_locations (self):
+        return self.get_alignments(format=list)
+
+    @alignment_locations.setter
+    def alignment_locations (self, alignments):
+        self.set_alignments(alignments)
+
+    def get_alignments (self, format=list):
+        '''
+        Get read alignments for the read.
+        @param: format (collection or iterator) format in which to
+        acquire the alignments
+        '''
+        assert (format in [iter, list, set])
+        table = self.table
+        read_num = self.read_num
+        return format([TableAlignment(table, read_num, row) for row in table.get_rows(read_num)])
+
+    def set_alignments (self, alignments):
+        '''
+        @param alignments ([TableAlignment]) alignments of this read
+        '''
+        rows = []
+        for alignment in alignments:
+            assert (alignment.table is self.table and alignment.read_num == self.read_num)
+            rows.append(alignment.row)
+        self.table.set_rows(self.read_num, rows)
+
+    def has_alignments (self):
+        return len(self.table.get_rows(self.read_num)) > 0
+
+    def __eq__ (self, other):
+        return isinstance(other, TableRead) and \
+               (self.table, self.read_num) == (other.table, other.read_num)
+
+    def __ne__ (self, other):
+        return not self == other
+
+    def __hash__ (self):
+        return hash((id(self.table), self.read_num))
+
+
+class TableAlignment (AlignedCdsMixin):
+    ''' Alignment stored in an AlignmentTable.
+        Offers the same interface as data.alignment.ReadAlnLocation.
+    '''
+    __slots__ = ('table', 'read_num', 'row')
+
+    def __init__ (self, table, read_num, row):
+        self.table      = table
+        self.read_num   = read_num
+        self.row        = row
+
+    @property
+    def read_id (self):
+        read_id = self.table.read_ids[self.read_num]
+        if self.table.read_fields['renamed'][self.read_num]:
+            read_id = read_id[:-len('#2')]
+        return read_id
+
+    @property
+    def nucleotide_accession (self):
+        return self.table.accessions[self.table.fields['accession_id'][self.row]]
+
+    @property
+    def db_source (self):
+        return self.table.db_sources[self.table.fields['db_source_id'][self.row]]
+
+    @property
+    def genome_index (self):
+        return int(self.table.fields['genome_index'][self.row])
+
+    @property
+    def score (self):
+        return float(self.table.fields['score'][self.row])
+
+    @property
+    def location_span (self):
+        fields = self.table.fields
+        return (int(fields['start'][self.row]), int(fields['stop'][self.row]))
+
+    @property
+    def complement (self):
+        return bool(self.table.fields['complement'][self.row])
+
+    @property
+    def active (self):
+        return bool(self.table.fields['active'][self.row])
+
+    @active.setter
+    def active (self, active):
+        self.table.fields['active'][self.row] = active
+
+    @property
+    def tax_id (self):
+        tax_id = int(self.table.fields['tax_id'][self.row])
+        return None if tax_id == AlignmentTable.NO_TAXID else tax_id
+
+    @tax_id.setter
+    def tax_id (self, tax_id):
+        self.table.fields['tax_id'][self.row] = AlignmentTable.NO_TAXID if tax_id is None else tax_id
+
+    @property
+    def potential_host (self):
+        return _from_flag(self.table.fields['potential_host'][self.row])
+
+    @potential_host.setter
+    def potential_host (self, potential_host):
+        self.table.fields['potential_host'][self.row] = _to_flag(potential_host)
+
+    @property
+    def aligned_cdss (self):
+        return self.table.aligned_cdss.get(self.row, [])
+
+    @aligned_cdss.setter
+    def aligned_cdss (self, aligned_cdss):
+        self.table.aligned_cdss[self.row] = aligned_cdss
+
+    def set_active (self, active):
+        self.active = active
+
+    def set_potential_host_status (self, potential_host):
+        self.potential_host = potential_host
+
+    def is_potential_host (self):
+        return self.potential_host
+
+    def __eq__ (self, other):
+        return isinstance(other, TableAlignment) and \
+               (self.table, self.row) == (other.table, other.row)
+
+    def __ne__ (self, other):
+        return not self == other
+
+    def __hash__ (self):
+        return hash((id(self.table), self.row))
@@ -144,10 +144,9 @@ def _create_organisms(target_organism_taxids, tax_tree):
 def determine_target_organism(alignment_tax_id, target_organism_taxids, tax_tree):
     if alignment_tax_id in target_organism_taxids:
         return alignment_tax_id
-    parent_taxids = []
-    for target_taxid in target_organism_taxids:
-        if tax_tree.is_child(alignment_tax_id, target_taxid):
-            parent_taxids.append(target_taxid)
+    is_parent = tax_tree.is_child_batch([alignment_tax_id], target_organism_taxids)[0]
+    parent_taxids = [target_taxid for (target_taxid, parent) in
+                     zip(target_organism_taxids, is_parent) if parent]
     # if only one parent taxid present, return that one
     if len(parent_taxids) == 1:
         return parent_taxids[0]
@@ -192,19 +191,15 @@ def extract_coding_target_alignments(
                 read2cds_repository,
                 target_organism_taxids,
                 tax_tree):
+    coding_alignments = [alignment for alignment in read_alignments
+                         if len(alignment.aligned_cdss) != 0]
+    if not coding_alignments:
+        return []
+    is_child = tax_tree.is_child_batch([alignment.tax_id for alignment in coding_alignments],
+                                       target_organism_taxids).any(axis=1)
     coding_target_alignments = []
-    for alignment in read_alignments:
-        is_target = False
-        if len(alignment.aligned_cdss) == 0:
-            continue
-        else:
-            if alignment.tax_id in target_organism_taxids:
-                is_target = True
-            else:
-                for tax_id in target_organism_taxids:
-                    if tax_tree.is_child(alignment.tax_id, tax_id):
-                        is_target = True
-        if is_target:
+    for (alignment, child) in zip(coding_alignments, is_child):
+        if child or alignment.tax_id in target_organism_taxids:
             coding_target_alignments.append(alignment)
     return coding_target_alignments
 
@@ -214,17 +209,10 @@ def extract_noncoding_target_alignments(
                 target_organism_taxids,
                 tax_tree):
     noncoding_target_alignments = []
-    for alignment in read_alignments:
-        print alignment.tax_id
-        is_target = False
-        if alignment.tax_id in target_organism_taxids:
-            is_target = True
-        else:
-            for tax_id in target_organism_taxids:
-                if tax_tree.is_child(alignment.tax_id, tax_id):
-                    is_target = True
-        if is_target:
-            print is_target
+    is_child = tax_tree.is_child_batch([alignment.tax_id for alignment in read_alignments],
+                                       target_organism_taxids).any(axis=1)
+    for (alignment, child) in zip(read_alignments, is_child):
+        if child or alignment.tax_id in target_organism_taxids:
             noncoding_target_alignments.append(alignment)
     return noncoding_target_alignments
 
@@ -147,11 +147,7 @@ def mark_single_alignment_read(read, read2cds_repository, tax_tree, target_organ
     # organism count status
     org_count = organism_count_status.ONE_ORGANISM
     # organism type status
-    mapped_to_target = False
-    for tax_id in target_organisms:
-        if tax_tree.is_child(alignment.tax_id, tax_id):
-            mapped_to_target = True
-            break
+    mapped_to_target = bool(tax_tree.is_child_batch([alignment.tax_id], target_organisms).any())
     if mapped_to_target:
         org_type = organism_type_status.TARGET_ORGANISM
     else:
@@ -225,17 +221,16 @@ def mark_multiple_alignment_read(read, read2cds_repository, tax_tree, target_org
 
 
 def get_child_count(tax_ids, target_organisms, tax_tree):
+    tax_ids = list(tax_ids)
+    target_organisms = list(target_organisms)
+    is_child = tax_tree.is_child_batch(tax_ids, target_organisms)
     children_count = 0
     parent_taxids = set()
-    for tax_id in tax_ids:
-        child = False
-        if tax_id in target_organisms:
-            child = True
-        for target_taxid in target_organisms:
-            if tax_tree.is_child(tax_id, target_taxid):
-                child = True
-                parent_taxids.add(target_taxid)
-                break
-        if child:
+    for (tax_id, child_row) in zip(tax_ids, is_child):
+        parents = child_row.nonzero()[0]
+        if len(parents):
+            # first target organism the tax ID is child of
+            parent_taxids.add(target_organisms[parents[0]])
+        if len(parents) or tax_id in target_organisms:
             children_count += 1
     return children_count, len(parent_taxids)
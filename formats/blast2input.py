@@ -1,4 +1,8 @@
+from itertools import islice
 
+from utils.compressed import open_input
+from data.read import Read
+from data.alignment import ReadAlnLocation
 
 
 class BLASTParser (object):
@@ -30,7 +34,7 @@ class BLASTParser (object):
          
     ############ ############ ##############
     def convert_file (self, blast_output_fname, output_fname):
-        blast_output_file = open(blast_output_fname)
+        blast_output_file = open_input(blast_output_fname)
         output_file       = open(output_fname, 'w')
         readline = blast_output_file.readline
         
@@ -59,6 +63,50 @@ class BLASTParser (object):
         print >> output_file, self.get_input_line(read_id, alignment_list)            
         blast_output_file.close()
     
+    def iter_reads (self, blast_output_fname, batch_size=10000):
+        ''' Streams the BLAST output as Read objects, without writing
+            and re-parsing the binner input format.
+            Consecutive lines with the same query id make one read,
+            the same as with convert_file. Lines are read and parsed
+            in batches of batch_size lines.
+            @return generator of Read objects
+        '''
+        blast_output_file = open_input(blast_output_fname)
+        read_id     = None
+        aln_locs    = []
+        try:
+            while (True):
+                lines = list(islice(blast_output_file, batch_size))
+                if not lines:
+                    break
+                for (new_read_id, aln_data) in self.parse_lines(lines):
+                    if new_read_id.startswith('@'):
+                        new_read_id = new_read_id[1:]
+                    if new_read_id != read_id:
+                        if read_id is not None:
+                            yield Read(read_id, None, aln_locs)
+                        read_id = new_read_id
+                        aln_locs = []
+                    aln_locs.append(aln_data.to_read_alignment(read_id))
+        finally:
+            blast_output_file.close()
+        if read_id is not None:
+            yield Read(read_id, None, aln_locs)
+
+    def parse_lines (self, lines):
+        ''' Parses a batch of BLAST output lines.
+            Empty lines and comments are skipped.
+            @return list of tuples (query_id, AlignmentData)
+        '''
+        parse_line = self.parse_line
+        parsed = []
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parsed.append(parse_line(line))
+        return parsed
+
     def get_input_line (self, read_id, alignment_data):
         output_line = "{0},{1};".format(read_id, len(alignment_data))
         for alignment in alignment_data:
@@ -97,6 +145,15 @@ class AlignmentData (object):
         else:
             self.strand = '-'
             
+    def to_read_alignment (self, read_id):
+        ''' Creates the read alignment location equivalent to the
+            binner input format string of this alignment.
+            @return ReadAlnLocation
+        '''
+        return ReadAlnLocation(read_id, self.nucleotide_accession, self.db_source,
+                               self.gi, self.score, (self.start, self.stop),
+                               self.strand == '-')
+
     def __str__(self, *args, **kwargs):
         return "{0},{1},{2},{3},{4},{5},{6}".format (self.nucleotide_accession,
                                                      self.db_source, self.gi,
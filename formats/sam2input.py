@@ -1,7 +1,19 @@
 import pysam
+import collections
+import logging
+import multiprocessing
 import os, sys
 sys.path.append(os.getcwd())
 
+from data.read import Read
+from data.alignment import ReadAlnLocation
+
+log = logging.getLogger(__name__)
+
+# Indexed BAM files are read in tasks covering about this many reference
+# bases (see iter_reads_indexed)
+TASK_LENGTH = 10000000
+
 class SamParser(object):
     def convert_file(self, sam_input_fname, output_fname):
 
@@ -11,6 +23,46 @@ class SamParser(object):
         output_file = open(output_fname, 'w')
 
         #---- PARSE ----#
+        for (reads_to_process, is_last) in self.iter_read_groups(sam_file):
+            # The last one?
+            if is_last:
+                self._process_reads(reads_to_process, sam_file, output_file)
+                continue
+            try:
+                self._process_reads(reads_to_process, sam_file, output_file)
+            except Exception:
+                print "alen and aend are None!"
+
+        output_file.close()
+
+    def iter_reads(self, sam_input_fname):
+        '''
+        Creates Read objects (with their alignment locations) directly
+        from the SAM/BAM file, without the binner input format.
+        Reads are the same as the ones convert_file would write, reads
+        with an alignment without location are skipped.
+        @return generator of Read objects
+        '''
+        sam_file = pysam.Samfile(sam_input_fname)
+        try:
+            for (reads_to_process, is_last) in self.iter_read_groups(sam_file):
+                try:
+                    read = self._create_read(reads_to_process, sam_file)
+                except Exception:
+                    log.info("Skipping read %s, alen and aend are None.",
+                             _get_read_id(reads_to_process[0].qname))
+                    continue
+                yield read
+        finally:
+            sam_file.close()
+
+    def iter_read_groups(self, sam_file):
+        '''
+        Groups consecutive alignments with the same query name
+        (multiple alignments of a single read).
+        @return generator of tuples (list of aligned reads,
+        True for the last group)
+        '''
         last_read_id = None
         reads_to_process = []
         for readAlignment in sam_file.fetch():
@@ -25,16 +77,12 @@ class SamParser(object):
                 continue
             # next read
             else:
-                try:
-                    self._process_reads(reads_to_process, sam_file, output_file)
-                except Exception:
-                    print "alen and aend are None!" 
+                yield (reads_to_process, False)
                 reads_to_process = [readAlignment]
                 last_read_id = readAlignment.qname
 
-        # The last one?
-        self._process_reads(reads_to_process, sam_file, output_file)
-        output_file.close()
+        if reads_to_process:
+            yield (reads_to_process, True)
 
     def _process_reads(self, reads_to_process, sam_file, output_file):
         read_id = reads_to_process[0].qname
@@ -50,17 +98,182 @@ class SamParser(object):
 
         output_file.write('%s\n' % read_str)
 
+    def _create_read(self, reads_to_process, sam_file):
+        read_id = _get_read_id(reads_to_process[0].qname)
+        if len(reads_to_process) == 1 and reads_to_process[0].is_unmapped:
+            return Read(read_id, None, [])
 
-    def _format_str(self, sam_aligned_read, sam_file):
+        aln_locs = []
+        for read in reads_to_process:
+            aln_locs.append(_create_alignment(read_id, self._get_alignment_data(read, sam_file)))
+        return Read(read_id, None, aln_locs)
+
+    def _get_alignment_data(self, sam_aligned_read, sam_file):
+        '''
+        @return tuple(accession, db_source, gi, score, start, stop, complement)
+        '''
         (x,gi,db_source,accession,x) = sam_file.getrname(sam_aligned_read.rname).split('|')
         score = sam_aligned_read.mapq
         start = sam_aligned_read.aend - sam_aligned_read.alen
         stop  = sam_aligned_read.aend
-        strand = '-' if sam_aligned_read.is_reverse else '+'
+        complement = sam_aligned_read.is_reverse
+
+        return (accession, db_source, gi, score, start, stop, complement)
+
+    def _format_str(self, sam_aligned_read, sam_file):
+        (accession, db_source, gi, score, start, stop, complement) = \
+            self._get_alignment_data(sam_aligned_read, sam_file)
+        strand = '-' if complement else '+'
 
         return '{0},{1},{2},{3},{4},{5},{6}'.format(accession, db_source, gi, score, start, stop, strand)
 
 
+def has_index(bam_fname):
+    '''
+    Returns True if there is a BAI or CSI index next to the BAM file.
+    '''
+    candidates = [bam_fname + '.bai', bam_fname + '.csi',
+                  os.path.splitext(bam_fname)[0] + '.bai']
+    return any(os.path.exists(candidate) for candidate in candidates)
+
+def iter_reads_indexed(bam_fname, workers):
+    '''
+    Creates Read objects from an indexed BAM file, the same ones as
+    SamParser.iter_reads, reading the file in parallel.
+    References are split into regions (see _split_regions), alignments
+    of the regions are fetched and grouped by a pool of worker processes,
+    at most 2 * workers tasks at a time. Results are merged in file order,
+    so consecutive alignments with the same query name make a read also
+    across task boundaries, and an unmapped read makes a read without
+    alignments. As with SamParser.iter_reads (which fetches through the
+    index), unmapped reads without a position are not reached.
+    @param workers (int) number of worker processes
+    @return generator of Read objects, in file order
+    '''
+    sam_file = pysam.Samfile(bam_fname)
+    tasks = [(bam_fname, regions) for regions
+             in _split_regions(sam_file.references, sam_file.lengths, TASK_LENGTH)]
+    sam_file.close()
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        group = None
+        for groups in _imap_bounded(pool, _fetch_regions, tasks, 2 * workers):
+            for next_group in groups:
+                if group is not None and group[0] == next_group[0]:
+                    # alignments of the read continue in the next task
+                    group[1].extend(next_group[1])
+                    continue
+                if group is not None:
+                    read = _create_read_from_group(group)
+                    if read is not None:
+                        yield read
+                group = next_group
+        if group is not None:
+            read = _create_read_from_group(group)
+            if read is not None:
+                yield read
+    finally:
+        pool.terminate()
+
+def _split_regions(references, lengths, task_length):
+    '''
+    Splits the references into tasks of regions covering about
+    task_length bases. Long references are split into several regions,
+    short ones are packed into a single task.
+    @return list of lists of tuples (reference, start, end), in file order
+    '''
+    tasks = []
+    regions = []
+    size = 0
+    for (reference, length) in zip(references, lengths):
+        for start in xrange(0, length, task_length):
+            end = min(start + task_length, length)
+            regions.append((reference, start, end))
+            size += end - start
+            if size >= task_length:
+                tasks.append(regions)
+                regions = []
+                size = 0
+    if regions:
+        tasks.append(regions)
+    return tasks
+
+def _imap_bounded(pool, function, tasks, max_in_flight):
+    '''
+    Same as pool.imap, but at most max_in_flight tasks are submitted
+    ahead of the consumed results.
+    @return generator of results, in order of the tasks
+    '''
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(pool.apply_async(function, (task,)))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def _fetch_regions(task):
+    '''
+    Worker function - groups consecutive alignments with the same query
+    name (see SamParser.iter_read_groups) fetched from the regions.
+    Alignments starting before a region are left to the previous one.
+    @param task tuple(BAM file name, list of (reference, start, end))
+    @return list of tuples (query name, list of tuples (True for an
+    unmapped read, tuple (accession, db_source, gi, score, start, stop,
+    complement) or None if the alignment has no location))
+    '''
+    (bam_fname, regions) = task
+    parser = SamParser()
+    sam_file = pysam.Samfile(bam_fname)
+    groups = []
+    try:
+        for (reference, start, end) in regions:
+            for sam_aligned_read in sam_file.fetch(reference, start, end):
+                if sam_aligned_read.pos < start:
+                    continue
+                try:
+                    alignment = parser._get_alignment_data(sam_aligned_read, sam_file)
+                except Exception:
+                    alignment = None
+                entry = (sam_aligned_read.is_unmapped, alignment)
+                if groups and groups[-1][0] == sam_aligned_read.qname:
+                    groups[-1][1].append(entry)
+                else:
+                    groups.append((sam_aligned_read.qname, [entry]))
+    finally:
+        sam_file.close()
+    return groups
+
+def _create_read_from_group(group):
+    '''
+    Creates the read from alignments grouped by _fetch_regions, the same
+    as SamParser._create_read.
+    @return Read, None if some of the alignments have no location
+    '''
+    (qname, entries) = group
+    read_id = _get_read_id(qname)
+    if len(entries) == 1 and entries[0][0]:
+        return Read(read_id, None, [])
+    if any(alignment is None for (unmapped, alignment) in entries):
+        log.info("Skipping read %s, alen and aend are None.", read_id)
+        return None
+    return Read(read_id, None, [_create_alignment(read_id, alignment)
+                                for (unmapped, alignment) in entries])
+
+def _get_read_id(qname):
+    # same as Read.from_read_str
+    read_id = qname
+    if read_id.startswith('@'):
+        read_id = read_id[1:]
+    return read_id
+
+def _create_alignment(read_id, alignment_data):
+    (accession, db_source, gi, score, start, stop, complement) = alignment_data
+    return ReadAlnLocation(read_id, accession, db_source, int(gi), float(score),
+                           (start, stop), complement)
+
+
 def main():
     if len(sys.argv) < 3:
         print 'Usage:\npython sam2input.py <INPUT SAM FILE> <BINNER INPUT FILE>'
@@ -0,0 +1,279 @@
+'''
+Offline CDS store - the unity database tables (cds, rrna, mrna,
+misc_rna) exported into a single memory mapped binary container file
+(see utils.binfile), so that records can be served without a database
+server.
+
+Every table is stored as a set of columns prefixed with the table name:
+* accessions: sorted accession.versions (fixed width strings), looked
+  up by binary search
+* record_offsets: CSR offsets, features of the i-th accession are
+  record_offsets[i]:record_offsets[i+1], sorted by start
+* start, end, strand: span of the feature location and its strand
+  (-1 for complement locations)
+* id, nucl_gi, prot_gi, taxon: integer fields, -1 for NULL
+* location, db, protein_id, locus_tag, product, gene: packed strings
+  (<field>_buffer and <field>_offsets) in UTF-8, empty string for NULL,
+  returned as unicode like from the database
+
+Usage (one-time export):
+python ncbi/db/cds_store.py <UNITY DB URL> <OUTPUT FILE> [TABLE ...]
+'''
+import sys
+import itertools
+import numpy
+from sqlalchemy import text
+
+from ncbi.db.unity import UnityRecord, UnityCDS
+from utils.binfile import write_arrays, read_arrays, pack_strings, StringTable
+from utils.location import Location
+
+FILE_TYPE = 'cds_store'
+TABLES = ['cds', 'mrna', 'rrna', 'misc_rna']
+INT_FIELDS = ['id', 'nucl_gi', 'prot_gi', 'taxon']
+STRING_FIELDS = ['location', 'db', 'protein_id', 'locus_tag', 'product', 'gene']
+# Value stored for NULL integer fields
+NULL_INT = -1
+# Number of rows fetched from the database at a time during export
+EXPORT_CHUNK_SIZE = 100000
+
+class CdsStore (object):
+    ''' Read only access to a CDS store file. Columns are memory
+        mapped, records are created on access.
+    '''
+
+    def __init__ (self, fname):
+        '''
+        @param fname (str) CDS store file (see export_cds_store)
+        '''
+        (arrays, attributes) = read_arrays(fname, FILE_TYPE)
+        self.fname = fname
+        self.tables = {}
+        for table in attributes['tables']:
+            columns = dict((name[len(table) + 1:], array) for (name, array)
+                           in arrays.items() if name.startswith(table + '.'))
+            for field in STRING_FIELDS:
+                columns[field] = StringTable(columns.pop(field + '_buffer'),
+                                             columns.pop(field + '_offsets'))
+            self.tables[str(table)] = columns
+
+    def get_record (self, version, table='cds'):
+        '''
+        Returns the record associated with the given accession.version.
+
+        :param version: string - GenBank/EMBL/DDBJ/RefSeq Accesion.Version
+        :returns: UnityRecord - record associated with the given
+                  accession.version. None if no record is found
+        '''
+        return self.get_records([version], table).get(version)
+
+    def get_records (self, versions, table='cds', batch_size=None):
+        '''
+        Returns the records associated with the given accession.versions.
+        All versions are looked up at once, batch_size is accepted for
+        compatibility with DbQuery.get_records.
+
+        :returns: dict(key=accession.version, value=UnityRecord) - versions
+                  without a record are left out
+        '''
+        columns = self._get_table(table)
+        versions = [version for version in set(versions)
+                    if len(version) <= columns['accessions'].dtype.itemsize]
+        if not versions or not len(columns['accessions']):
+            return {}
+        positions = numpy.searchsorted(columns['accessions'],
+                                       numpy.array(versions, dtype=columns['accessions'].dtype))
+        positions = numpy.minimum(positions, len(columns['accessions']) - 1)
+        found = columns['accessions'][positions] == numpy.array(versions)
+
+        records = {}
+        offsets = columns['record_offsets']
+        for (version, position) in zip(numpy.array(versions)[found].tolist(),
+                                       positions[found].tolist()):
+            record = UnityRecord(version)
+            for feature in xrange(offsets[position], offsets[position + 1]):
+                record.add_cds(self._create_cds(columns, version, feature))
+            records[version] = record
+        return records
+
+    def get_record_count (self, table='cds'):
+        '''
+        @return (int) number of accession.versions with features in the table
+        '''
+        return len(self._get_table(table)['accessions'])
+
+    def _get_table (self, table):
+        if table not in TABLES:
+            raise ValueError('Nonexistent table %s. Only cds, rrna, mrna and misc_rna supported.' % table)
+        if table not in self.tables:
+            raise ValueError('Table %s has not been exported to %s.' % (table, self.fname))
+        return self.tables[table]
+
+    def _create_cds (self, columns, version, feature):
+        attributes = {'version': version}
+        for field in INT_FIELDS:
+            value = int(columns[field][feature])
+            attributes[field] = None if value == NULL_INT else value
+        for field in STRING_FIELDS:
+            value = columns[field][feature]
+            attributes[field] = value.decode('utf-8') if value else None
+        return UnityCDS(attributes)
+
+
+def export_cds_store (db_query, fname, tables=TABLES, chunk_size=EXPORT_CHUNK_SIZE):
+    '''
+    Exports the unity database tables into a CDS store file.
+    Rows are fetched chunk_size at a time and held in memory only as
+    columns (see get_table_arrays).
+    @param db_query (DbQuery) access to the unity database
+    @param fname (str) output file
+    @param tables list of exported tables
+    @param chunk_size (int) number of rows fetched at a time
+    '''
+    arrays = {}
+    for table in tables:
+        if table not in TABLES:
+            raise ValueError('Nonexistent table %s. Only cds, rrna, mrna and misc_rna supported.' % table)
+        sess = db_query.unity_session()
+        try:
+            result = sess.execute(text("""
+                SELECT id, db, version, nucl_gi, taxon, location,
+                    protein_id, locus_tag, product, gene, prot_gi
+                FROM %s
+                WHERE version IS NOT NULL;
+            """ % table).execution_options(stream_results=True))
+            columns = get_table_arrays(_iter_rows(result, chunk_size), chunk_size)
+        finally:
+            db_query.unity_session.remove()
+        for (name, array) in columns.items():
+            arrays['%s.%s' % (table, name)] = array
+    write_arrays(fname, FILE_TYPE, arrays, {'tables': list(tables)})
+
+def get_table_arrays (rows, chunk_size=EXPORT_CHUNK_SIZE):
+    '''
+    Creates CDS store columns of a single table.
+    Rows are converted into columns chunk_size rows at a time, the
+    columns of all the chunks are then merged and sorted by
+    accession.version and start.
+    @param rows iterable of dicts with unity table columns
+    @param chunk_size (int) number of rows converted at a time
+    @return dict(key=column name, value=numpy array)
+    '''
+    rows = iter(rows)
+    chunks = []
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        chunks.append(_get_chunk_arrays(chunk))
+    columns = _merge_chunks(chunks) if chunks else _get_chunk_arrays([])
+    del chunks
+
+    # features of a record in the order of UnityCDS.location_min
+    (accessions, record_ids) = numpy.unique(columns.pop('version'), return_inverse=True)
+    start = columns['start']
+    order = numpy.lexsort((numpy.where(start == NULL_INT, sys.maxint, start), record_ids))
+    counts = numpy.bincount(record_ids, minlength=len(accessions)) if len(record_ids) else []
+    record_offsets = numpy.zeros(len(accessions) + 1, dtype=numpy.int64)
+    numpy.cumsum(counts, out=record_offsets[1:])
+    del record_ids
+
+    for name in ['start', 'end', 'strand'] + INT_FIELDS:
+        columns[name] = columns[name][order]
+    for field in STRING_FIELDS:
+        (columns[field + '_buffer'], columns[field + '_offsets']) = _take_strings(
+            columns[field + '_buffer'], columns[field + '_offsets'], order, chunk_size)
+    columns['accessions'] = accessions
+    columns['record_offsets'] = record_offsets
+    return columns
+
+def _iter_rows (result, chunk_size):
+    ''' Yields rows of a query result as dicts, fetching chunk_size
+        rows at a time.
+    '''
+    while True:
+        rows = result.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            yield dict(row)
+
+def _get_chunk_arrays (rows):
+    ''' @return dict(key=column name, value=numpy array) columns of
+        the rows in their original order, with a version column
+        instead of accessions and record offsets
+    '''
+    versions = [str(row['version']) for row in rows]
+    spans = []
+    for row in rows:
+        location = row.get('location') or ''
+        (start, end) = Location.fast_span_str(location) or (NULL_INT, NULL_INT)
+        spans.append((start, end, -1 if 'complement' in location else 1))
+
+    columns = {
+        'version'   : numpy.array(versions, dtype='S%d' % max([1] + map(len, versions))),
+        'start'     : numpy.array([span[0] for span in spans], dtype=numpy.int64),
+        'end'       : numpy.array([span[1] for span in spans], dtype=numpy.int64),
+        'strand'    : numpy.array([span[2] for span in spans], dtype=numpy.int8),
+    }
+    for field in INT_FIELDS:
+        columns[field] = numpy.array([NULL_INT if row.get(field) is None else row[field]
+                                      for row in rows],
+                                     dtype=numpy.int32 if field == 'taxon' else numpy.int64)
+    for field in STRING_FIELDS:
+        (columns[field + '_buffer'], columns[field + '_offsets']) = pack_strings(
+            _encode(row.get(field)) for row in rows)
+    return columns
+
+def _merge_chunks (chunks):
+    ''' Concatenates columns of the chunks (see _get_chunk_arrays).
+    '''
+    columns = {}
+    for name in chunks[0]:
+        if not name.endswith('_offsets'):
+            columns[name] = numpy.concatenate([chunk[name] for chunk in chunks])
+    for field in STRING_FIELDS:
+        offsets = [chunk[field + '_offsets'] for chunk in chunks]
+        shifts = numpy.cumsum([0] + [chunk_offsets[-1] for chunk_offsets in offsets[:-1]])
+        columns[field + '_offsets'] = numpy.concatenate(
+            [offsets[0][:1]] + [chunk_offsets[1:] + shift for (chunk_offsets, shift)
+                                in zip(offsets, shifts)])
+    return columns
+
+def _take_strings (buf, offsets, order, chunk_size):
+    ''' Reorders packed strings (see pack_strings), string i of the
+        result is string order[i]. Bytes are copied chunk_size strings
+        at a time.
+        @return tuple(buffer, offsets)
+    '''
+    lengths = (offsets[1:] - offsets[:-1])[order]
+    new_offsets = numpy.zeros(len(order) + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=new_offsets[1:])
+    new_buf = numpy.empty(new_offsets[-1], dtype=numpy.uint8)
+    for begin in xrange(0, len(order), chunk_size):
+        end = min(begin + chunk_size, len(order))
+        (first, last) = (new_offsets[begin], new_offsets[end])
+        # position of each copied byte in the original buffer
+        positions = numpy.repeat(offsets[order[begin:end]] - new_offsets[begin:end],
+                                 lengths[begin:end]) + numpy.arange(first, last)
+        new_buf[first:last] = buf[positions]
+    return (new_buf, new_offsets)
+
+def _encode (value):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def main():
+    if len(sys.argv) < 3:
+        print 'Usage:\npython cds_store.py <UNITY DB URL> <OUTPUT FILE> [TABLE ...]'
+        sys.exit(-1)
+    from ncbi.db.access import DbQuery
+    export_cds_store(DbQuery(sys.argv[1]), sys.argv[2], sys.argv[3:] or TABLES)
+
+
+if __name__=='__main__':
+    main()
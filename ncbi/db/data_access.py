@@ -1,6 +1,10 @@
+import copy
+import numpy
+
 from utils import enum
 from ncbi.db.ncbitax_from_file import *
 from ncbi.db.access import DbQuery
+from ncbi.db.cds_store import CdsStore
 
 class DataAccess ():
     '''
@@ -21,6 +25,7 @@ class DataAccess ():
         '''
         :param An object containing following parameters:
         (Currently used with ArgumentParser.parse_args() return value)
+        * cds_store
         * cds_fasta
         * cds_db_connection
         * gi2taxid
@@ -30,10 +35,14 @@ class DataAccess ():
         '''
         self._h_set_load_type(args)
 
+        # CDS store file (see ncbi.db.cds_store) is served without a database
+        self._cds_store = None
         if self.cds_source_type == DataAccess.load_type.FILE:
-            raise ValueError('Loading CDSs from fasta file currently not supported.')
+            self._cds_store = CdsStore(self.cds_source)
 
-        self._db_access = DbQuery()
+        self._db_access = None
+        if DataAccess.load_type.DATABASE in (self.cds_source_type, self.ncbitax_source_type):
+            self._db_access = DbQuery()
 
         if self.ncbitax_source_type == DataAccess.load_type.FILE:
             self._h_load_ncbitax_data()
@@ -56,7 +65,36 @@ class DataAccess ():
         :returns: UnityRecord - record associated with the given
                   accession.version. None if no record is found
         '''
-        return self._db_access.get_record(version)
+        if self._cds_store is not None:
+            return self._cds_store.get_record(version, table)
+        return self._db_access.get_record(version, table)
+
+    def get_records(self, versions, table='cds', batch_size=None):
+        '''
+        Returns the records associated with the given accession.versions
+        (see DbQuery.get_records).
+
+        :param versions: list of GenBank/EMBL/DDBJ/RefSeq Accesion.Versions
+        :returns: dict(key=accession.version, value=UnityRecord) - versions
+                  without a record are left out
+        '''
+        if self._cds_store is not None:
+            return self._cds_store.get_records(versions, table, batch_size)
+        return self._db_access.get_records(versions, table, batch_size)
+
+    def create_pooled(self, pool_size):
+        '''
+        Creates a data access sharing the loaded data, whose records
+        are fetched over its own pool of database connections
+        (see DbQuery.create_pooled).
+
+        :param pool_size: int - number of pooled connections
+        :rtype DataAccess
+        '''
+        pooled = copy.copy(self)
+        if self._db_access is not None:
+            pooled._db_access = self._db_access.create_pooled(pool_size)
+        return pooled
 
     def get_taxids (self, gis, format=dict):
         '''
@@ -69,8 +107,10 @@ class DataAccess ():
         contain duplicates.
         '''
         requested_gis = {}
-        if self.ncbitax_source == DataAccess.load_type.FILE:
-            requested_gis = dict((gi, self._gi2taxid_file_access.get(gi,-1)) for gi in gis)
+        if self.ncbitax_source_type == DataAccess.load_type.FILE:
+            gis = numpy.asarray(gis, dtype=numpy.int64)
+            taxids = lookupTaxids(self._gi2taxid_gis, self._gi2taxid_taxids, gis)
+            requested_gis = dict(zip(gis.tolist(), taxids.tolist()))
         else:
             for i in range(len(gis)-1,-1,-1):
                 taxid = self._gi2taxid_cache.get(gis[i], None)
@@ -104,8 +144,9 @@ class DataAccess ():
     def _h_load_ncbitax_data(self):
         '''
         Loads taxonomy data from NCBI taxonomy dump files.
-        After invoking this method, you can query three dictionaries:
-        * gi2taxid (by GI)
+        After invoking this method, you can query GI sorted gi2taxid
+        arrays (memory mapped if the gi2taxid file has been converted,
+        see convertGi2Taxid) and two dictionaries:
         * taxid2name (by taxid)
         * taxid2rank (by taxid)
         '''
@@ -113,7 +154,7 @@ class DataAccess ():
         nodes_fpath = self.ncbitax_source['nodes']
         names_fpath = self.ncbitax_source['names']
 
-        self._gi2taxid_file_access = loadGi2Taxid(gi2taxid_fpath)
+        (self._gi2taxid_gis, self._gi2taxid_taxids) = loadGi2TaxidArrays(gi2taxid_fpath)
         self._taxid2name_file_access = loadNcbiNames(names_fpath)
         self._taxid2rank_file_access = loadNcbiRanks(nodes_fpath)
 
@@ -129,9 +170,11 @@ class DataAccess ():
         * ncbitax_source ({ncbitaxfiletype:path_to_path})
         '''
         # determine CDS loading location
-        if args.cds_fasta is not None:
+        if args.cds_store is not None:
             self.cds_source_type = DataAccess.load_type.FILE
-            self.cds_source      = args.cds_fasta
+            self.cds_source      = args.cds_store
+        elif args.cds_fasta is not None:
+            raise ValueError('Loading CDSs from fasta file currently not supported.')
         else:
             assert (args.cds_db_connection is not None)
             self.cds_source_type = DataAccess.load_type.DATABASE
@@ -1,4 +1,5 @@
 from utils.location import Location
+from utils.compressed import open_input
 
 class MockRecord(object):
     ''' Attributes:
@@ -64,12 +65,13 @@ class MockDbQuery (object):
 
     def __init__ (self, cds_fname):
         '''
-        @param: cds_fname(str) Path to a regular FASTA file 
+        @param: cds_fname(str) Path to a regular FASTA file (can be
+        compressed, see utils.compressed)
         from which mock database access creates mock records
         which cdss that match the whole record.
         '''
         self.records = {}
-        cds_fhandle = open (cds_fname, 'r')
+        cds_fhandle = open_input (cds_fname)
         seq_len = 0
         accession = ''
         record_data = {}
@@ -1,4 +1,13 @@
 import os
+import sys
+import numpy
+
+from utils.binfile import write_arrays, read_arrays, read_header, BinaryFileError
+
+# Bytes of the dump file split at once by the dump loaders
+DUMP_CHUNK_SIZE = 64 << 20
+# Binary container type of converted gi2taxid files (see utils.binfile)
+GI2TAXID_FILE_TYPE = 'gi2taxid'
 
 def loadGi2Taxid(gi2taxid_dump):
     '''
@@ -33,6 +42,55 @@ def loadGi2Taxid(gi2taxid_dump):
 
     return gi2taxid
 
+def loadGi2TaxidArrays(gi2taxid_file):
+    '''
+    Loads GI to taxonomical ID mapping as two arrays sorted by GI,
+    to be queried with lookupTaxids.
+    Converted files (see convertGi2Taxid) are memory mapped, dump
+    files are parsed into memory.
+
+    :param gi2taxid_file path to converted file or gi_taxid_[nucl/prot]
+    dump file
+    :rtype tuple(gis:numpy.int64 array, taxids:numpy.int32 array)
+    '''
+    if not os.path.isfile(gi2taxid_file):
+        raise ValueError('''Path you supplied to the gi2taxid\
+             dump file seems to be invalid.''')
+    try:
+        read_header(gi2taxid_file, GI2TAXID_FILE_TYPE)
+    except BinaryFileError:
+        return _loadGi2TaxidDump(gi2taxid_file)
+    (arrays, attributes) = read_arrays(gi2taxid_file, GI2TAXID_FILE_TYPE)
+    return (arrays['gis'], arrays['taxids'])
+
+def convertGi2Taxid(gi2taxid_dump, output_file):
+    '''
+    Converts gi_taxid_[nucl/prot] dump file into a binary file with
+    GIs and taxonomical IDs sorted by GI, which can be memory mapped
+    by loadGi2TaxidArrays.
+
+    :param gi2taxid_dump path to gi_taxid_[nucl/prot] file
+    :param output_file path to the converted file
+    '''
+    (gis, taxids) = _loadGi2TaxidDump(gi2taxid_dump)
+    write_arrays(output_file, GI2TAXID_FILE_TYPE, {'gis': gis, 'taxids': taxids})
+
+def lookupTaxids(gis, taxids, query_gis, default=-1):
+    '''
+    Finds taxonomical IDs of all the queried GIs at once.
+
+    :param gis, taxids arrays sorted by GI (see loadGi2TaxidArrays)
+    :param query_gis list or array of GIs
+    :param default value for GIs without a taxonomical ID
+    :rtype numpy.int64 array of taxonomical IDs, aligned with query_gis
+    '''
+    query_gis = numpy.asarray(query_gis, dtype=numpy.int64)
+    if not len(gis):
+        return numpy.repeat(numpy.int64(default), len(query_gis))
+    positions = numpy.minimum(numpy.searchsorted(gis, query_gis), len(gis) - 1)
+    return numpy.where(gis[positions] == query_gis,
+                       taxids[positions].astype(numpy.int64), default)
+
 def loadNcbiNames(names_dump):
     '''
     Loads scientific names from NCBI names taxonomy dump.
@@ -40,7 +98,8 @@ def loadNcbiNames(names_dump):
     :param names_dump path to names dump file
     :rtype dict(key=taxid:int, value=organims_name:str)
     '''
-    pass
+    (taxids, names) = loadNcbiNameArrays(names_dump)
+    return dict(zip(taxids.tolist(), names))
 
 def loadNcbiRanks(nodes_dump):
     '''
@@ -49,12 +108,111 @@ def loadNcbiRanks(nodes_dump):
     :param nodes_dump path to nodes dump file
     :rtype dict(key=taxid:int, value=taxonomy_rank:str)
     '''
-    pass
+    (taxids, parent_taxids, ranks) = loadNcbiNodeArrays(nodes_dump)
+    return dict(zip(taxids.tolist(), ranks))
+
+def loadNcbiNodeArrays(nodes_dump):
+    '''
+    Loads the taxonomy tree from NCBI nodes dump (nodes.dmp from
+    taxdump archive on the NCBI taxonomy FTP site).
+
+    :param nodes_dump path to nodes dump file
+    :rtype tuple(taxids:numpy.int64 array, parent_taxids:numpy.int64 array,
+    ranks:[str])
+    '''
+    (taxids, parent_taxids, ranks) = _loadDumpColumns(nodes_dump, 3)
+    return (_toIntArray(taxids), _toIntArray(parent_taxids), ranks)
+
+def loadNcbiNameArrays(names_dump):
+    '''
+    Loads scientific names from NCBI names dump (names.dmp from
+    taxdump archive on the NCBI taxonomy FTP site). Other name
+    classes (synonyms, common names...) are skipped.
+
+    :param names_dump path to names dump file
+    :rtype tuple(taxids:numpy.int64 array, names:[str])
+    '''
+    (taxids, names, unique_names, name_classes) = _loadDumpColumns(names_dump, 4)
+    scientific = numpy.flatnonzero(numpy.array(name_classes) == 'scientific name')
+    names = numpy.array(names, dtype=object)[scientific].tolist()
+    return (_toIntArray(taxids)[scientific], names)
+
+def _loadDumpColumns(dump, column_count):
+    '''
+    Reads the first column_count columns of an NCBI taxonomy dump file.
+    Fields are separated by '\t|\t' and lines end with '\t|\n'.
+    File is read in large chunks, each of which is split at once.
+
+    :rtype list of columns, each a list of str
+    '''
+    if not os.path.isfile(dump):
+        raise ValueError('Path you supplied to the taxonomy dump file seems to be invalid: %s' % dump)
+    columns = [[] for i in xrange(column_count)]
+    dump_file = open(dump, 'r')
+    try:
+        while (True):
+            chunk = dump_file.read(DUMP_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunk += dump_file.readline()
+            lines = chunk.replace('\t|\n', '\t|\t').split('\t|\t')
+            # all the lines of a dump have the same number of fields
+            field_count = chunk.count('\t|\t', 0, chunk.index('\n')) + 1
+            if (len(lines) - 1) % field_count:
+                raise ValueError('Invalid line in taxonomy dump file %s.' % dump)
+            for (i, column) in enumerate(columns):
+                column.extend(lines[i:-1:field_count])
+    finally:
+        dump_file.close()
+    return columns
+
+def _loadGi2TaxidDump(gi2taxid_dump):
+    '''
+    Parses gi_taxid_[nucl/prot] dump file in large chunks. If a GI
+    repeats, its last taxonomical ID is used.
+
+    :rtype tuple(gis:numpy.int64 array, taxids:numpy.int32 array),
+    sorted by GI
+    '''
+    if not os.path.isfile(gi2taxid_dump):
+        raise ValueError('''Path you supplied to the gi2taxid\
+             dump file seems to be invalid.''')
+    gis = []
+    taxids = []
+    gi2taxid_file = open(gi2taxid_dump, 'r')
+    try:
+        while (True):
+            chunk = gi2taxid_file.read(DUMP_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunk += gi2taxid_file.readline()
+            values = numpy.fromstring(chunk, dtype=numpy.int64, sep=' ')
+            line_count = chunk.count('\n') + (not chunk.endswith('\n'))
+            if len(values) != 2 * line_count:
+                raise ValueError('''Cannot unpack splitted string into\
+                    two values (gi, taxid) for some line of input file %s.'''
+                    % gi2taxid_dump)
+            gis.append(values[0::2])
+            taxids.append(values[1::2].astype(numpy.int32))
+    finally:
+        gi2taxid_file.close()
+    gis = numpy.concatenate(gis) if gis else numpy.zeros(0, dtype=numpy.int64)
+    taxids = numpy.concatenate(taxids) if taxids else numpy.zeros(0, dtype=numpy.int32)
+
+    order = numpy.argsort(gis, kind='mergesort')
+    gis = gis[order]
+    taxids = taxids[order]
+    # last of the equal GIs (stable sort keeps file order)
+    last = numpy.r_[gis[1:] != gis[:-1], True] if len(gis) else numpy.zeros(0, dtype=bool)
+    return (gis[last], taxids[last])
+
+def _toIntArray(column):
+    # parsing a single joined string is much faster than int() per field
+    return numpy.fromstring(' '.join(column), dtype=numpy.int64, sep=' ')
 
 
 if __name__ == '__main__':
-    
-    import guppy.heapy.RM
-    file_location = raw_input('Enter file location:')
-    gi2taxid = loadGi2Taxid(file_location)
-    raw_input('Enter to finish off programme:')
\ No newline at end of file
+    if len(sys.argv) < 3:
+        print 'Usage:\npython ncbitax_from_file.py <GI_TAXID DUMP FILE> <OUTPUT FILE>'
+        sys.exit(-1)
+    convertGi2Taxid(sys.argv[1], sys.argv[2])
\ No newline at end of file
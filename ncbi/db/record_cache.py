@@ -0,0 +1,149 @@
+'''
+Persistent local cache of unity records (see ncbi.db.unity), shared
+across runs. Records are stored in a SQLite file keyed by table and
+accession.version, together with the time of their last use. When
+the cache grows over its size limit, least recently used records are
+evicted.
+Versions without a record in the database are cached too (as missing
+records), so they are not queried again.
+'''
+import os
+import time
+import sqlite3
+import cPickle
+
+from ncbi.db.unity import UnityRecord, UnityCDS
+
+# Default cache size limit in bytes (sum of pickled record sizes)
+DEFAULT_MAX_SIZE = 1 << 30
+# Number of versions looked up with a single query (SQLite allows
+# at most 999 parameters per statement)
+LOOKUP_BATCH_SIZE = 500
+# After eviction, the cache takes this fraction of its size limit
+EVICTION_TARGET = 0.9
+
+class RecordCache (object):
+    ''' SQLite file with pickled CDS attributes of records, LRU evicted.
+    '''
+
+    def __init__ (self, fname, max_size=DEFAULT_MAX_SIZE):
+        '''
+        @param fname (str) cache file, created if missing
+        @param max_size (int) size limit in bytes
+        '''
+        if max_size < 1:
+            raise ValueError('Cache size limit must be positive, got %d.' % max_size)
+        self.fname      = os.path.expanduser(fname)
+        self.max_size   = max_size
+        self.connection = sqlite3.connect(self.fname)
+        self.connection.text_factory = str
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS records (
+                tbl         TEXT NOT NULL,
+                version     TEXT NOT NULL,
+                data        BLOB,
+                size        INTEGER NOT NULL,
+                last_used   REAL NOT NULL,
+                PRIMARY KEY (tbl, version)
+            );
+            CREATE INDEX IF NOT EXISTS records_last_used ON records (last_used);
+        ''')
+
+    def get_records (self, versions, table='cds'):
+        '''
+        Looks up the records and marks them as recently used.
+        @param versions list of NT accession.versions
+        @param table (str) unity table the records come from
+        @return dict(key=accession.version, value=UnityRecord or None
+        for missing records), versions not in the cache are left out
+        '''
+        versions = list(versions)
+        records = {}
+        with self.connection:
+            for start in range(0, len(versions), LOOKUP_BATCH_SIZE):
+                batch = versions[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ', '.join('?' * len(batch))
+                rows = self.connection.execute(
+                    'SELECT version, data FROM records WHERE tbl = ? AND version IN (%s)'
+                    % placeholders, [table] + batch).fetchall()
+                for (version, data) in rows:
+                    records[version] = _unpack_record(version, data)
+                self.connection.execute(
+                    'UPDATE records SET last_used = ? WHERE tbl = ? AND version IN (%s)'
+                    % placeholders, [time.time(), table] + batch)
+        return records
+
+    def put_records (self, records, table='cds'):
+        '''
+        Adds the records to the cache, evicting least recently used
+        records if the cache gets over its size limit.
+        @param records dict(key=accession.version, value=UnityRecord or
+        None for missing records)
+        @param table (str) unity table the records come from
+        '''
+        now = time.time()
+        rows = []
+        for (version, record) in records.iteritems():
+            data = _pack_record(record)
+            rows.append((table, version, data, 0 if data is None else len(data), now))
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO records (tbl, version, data, size, last_used) '
+                'VALUES (?, ?, ?, ?, ?)', rows)
+            self._evict()
+
+    def get_size (self):
+        '''
+        @return (int) sum of sizes of all the cached records in bytes
+        '''
+        (size,) = self.connection.execute('SELECT SUM(size) FROM records').fetchone()
+        return size or 0
+
+    def __len__ (self):
+        (count,) = self.connection.execute('SELECT COUNT(*) FROM records').fetchone()
+        return count
+
+    def clear (self):
+        ''' Removes all the records from the cache.
+        '''
+        with self.connection:
+            self.connection.execute('DELETE FROM records')
+
+    def close (self):
+        self.connection.close()
+
+    def _evict (self):
+        ''' Removes least recently used records until the cache takes
+            at most EVICTION_TARGET of its size limit.
+        '''
+        size = self.get_size()
+        if size <= self.max_size:
+            return
+        excess = size - int(self.max_size * EVICTION_TARGET)
+        evicted = []
+        for (rowid, record_size) in self.connection.execute(
+                'SELECT rowid, size FROM records ORDER BY last_used'):
+            if excess <= 0:
+                break
+            evicted.append((rowid,))
+            excess -= record_size
+        self.connection.executemany('DELETE FROM records WHERE rowid = ?', evicted)
+
+
+def _pack_record (record):
+    ''' @return (buffer) pickled CDS attributes, None for missing records
+    '''
+    if record is None:
+        return None
+    return buffer(cPickle.dumps([cds.attributes for cds in record.cds],
+                                cPickle.HIGHEST_PROTOCOL))
+
+def _unpack_record (version, data):
+    ''' @return UnityRecord, None for missing records
+    '''
+    if data is None:
+        return None
+    record = UnityRecord(version)
+    for attributes in cPickle.loads(str(data)):
+        record.add_cds(UnityCDS(attributes))
+    return record
@@ -0,0 +1,189 @@
+'''
+Array backed views over the taxonomy tree.
+
+Each view exposes the same read only mapping interface as one of the
+TaxTree dictionaries (parent_nodes, child_nodes, nodes,
+tax2relevantTax), but the data is kept in numpy arrays indexed by the
+dense node index of a TaxIndex, instead of millions of Python objects.
+'''
+import collections
+import numpy
+
+from utils.binfile import pack_strings, StringTable
+
+class _TaxIndexMapping (collections.Mapping):
+    ''' Mapping over the tax IDs of a tree index.
+    '''
+
+    def __init__ (self, index):
+        self.index = index
+
+    def _get_index (self, taxid):
+        index = self.index.get_index(taxid)
+        if index == self.index.NO_INDEX:
+            raise KeyError(taxid)
+        return index
+
+    def __iter__ (self):
+        return iter(self.index.taxids.tolist())
+
+    def __len__ (self):
+        return self.index.get_node_count()
+
+    def __contains__ (self, taxid):
+        return self.index.contains(taxid)
+
+    def has_key (self, taxid):
+        return taxid in self
+
+
+class ParentNodesView (_TaxIndexMapping):
+    ''' Maps tax ID to parent tax ID (root is its own parent).
+    '''
+
+    def __getitem__ (self, taxid):
+        index = self.index
+        return int(index.taxids[index.parent[self._get_index(taxid)]])
+
+
+class RelevantTaxView (_TaxIndexMapping):
+    ''' Maps tax ID to its relevant tax ID (-1 for untagged nodes).
+    '''
+
+    def __init__ (self, index, relevant_categories, category_taxids):
+        '''
+        @param relevant_categories (numpy.int16 array) category of
+        every node, -1 for untagged nodes
+        @param category_taxids (numpy.int32 array) tax ID of every
+        category
+        '''
+        _TaxIndexMapping.__init__(self, index)
+        self.relevant_categories    = relevant_categories
+        self.category_taxids        = category_taxids
+
+    def __getitem__ (self, taxid):
+        category = self.relevant_categories[self._get_index(taxid)]
+        return -1 if category < 0 else int(self.category_taxids[category])
+
+
+class ChildNodesView (collections.Mapping):
+    ''' Maps tax ID to the list of tax IDs of its children. Children
+        are stored in CSR layout: children of node i are
+        children[child_offsets[i]:child_offsets[i+1]].
+        As the defaultdict it replaces, returns an empty list for
+        nodes without children, but contains only nodes which have
+        children.
+    '''
+
+    def __init__ (self, index, child_offsets, children):
+        self.index          = index
+        self.child_offsets  = child_offsets
+        self.children       = children
+
+    def _get_children (self, taxid):
+        index = self.index.get_index(taxid)
+        if index == self.index.NO_INDEX:
+            return self.children[:0]
+        return self.children[self.child_offsets[index]:self.child_offsets[index+1]]
+
+    def __getitem__ (self, taxid):
+        return self.index.taxids[self._get_children(taxid)].tolist()
+
+    def __contains__ (self, taxid):
+        return len(self._get_children(taxid)) > 0
+
+    def has_key (self, taxid):
+        return taxid in self
+
+    def __iter__ (self):
+        parents = numpy.flatnonzero(numpy.diff(self.child_offsets))
+        return iter(self.index.taxids[parents].tolist())
+
+    def __len__ (self):
+        return int(numpy.count_nonzero(numpy.diff(self.child_offsets)))
+
+
+class NodesView (_TaxIndexMapping):
+    ''' Maps tax ID to a node object holding its organism name and
+        rank. Nodes are created on access from the rank codes and the
+        packed names.
+    '''
+
+    def __init__ (self, index, ranks, rank_names, names, node_type):
+        '''
+        @param ranks (numpy.int16 array) rank code of every node,
+        -1 for nodes without taxonomy data
+        @param rank_names ([str]) rank of every rank code
+        @param names (StringTable) organism name of every node
+        @param node_type class of created nodes, called as
+        node_type(organism_name, rank)
+        '''
+        _TaxIndexMapping.__init__(self, index)
+        self.ranks      = ranks
+        self.rank_names = rank_names
+        self.names      = names
+        self.node_type  = node_type
+
+    def __getitem__ (self, taxid):
+        index = self.index.get_index(taxid)
+        if index == self.index.NO_INDEX or self.ranks[index] < 0:
+            raise KeyError(taxid)
+        return self.node_type(self.names[index], self.rank_names[self.ranks[index]])
+
+    def __contains__ (self, taxid):
+        index = self.index.get_index(taxid)
+        return index != self.index.NO_INDEX and self.ranks[index] >= 0
+
+    def __iter__ (self):
+        return iter(self.index.taxids[self.ranks >= 0].tolist())
+
+    def __len__ (self):
+        return int(numpy.count_nonzero(self.ranks >= 0))
+
+    def get_rank_code (self, rank):
+        ''' @return (int) code of the rank, -1 if no node has the rank
+        '''
+        if rank in self.rank_names:
+            return self.rank_names.index(rank)
+        return -1
+
+
+def get_child_arrays (index):
+    ''' Creates CSR child lists of the tree index.
+        @return tuple(child_offsets:numpy.int64 array,
+        children:numpy.int32 array)
+    '''
+    children = numpy.argsort(index.parent, kind='mergesort').astype(numpy.int32)
+    child_offsets = numpy.zeros(index.get_node_count() + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(index.parent, minlength=index.get_node_count()),
+                 out=child_offsets[1:])
+    return (child_offsets, children)
+
+def get_rank_arrays (index, nodes):
+    ''' Encodes ranks of the nodes (objects with a rank attribute) in
+        the order of the tree index.
+        @param nodes dict(key=taxid, value=node)
+        @return tuple(ranks:numpy.int16 array, rank_names:[str]),
+        rank code is -1 for nodes without taxonomy data
+    '''
+    if isinstance(nodes, NodesView):
+        return (nodes.ranks, nodes.rank_names)
+    rank_names = sorted(set(node.rank for node in nodes.itervalues()))
+    rank_codes = dict((rank, code) for (code, rank) in enumerate(rank_names))
+    ranks = numpy.array([rank_codes[nodes[taxid].rank] if taxid in nodes else -1
+                         for taxid in index.taxids.tolist()], dtype=numpy.int16)
+    return (ranks, rank_names)
+
+def get_node_arrays (index, nodes):
+    ''' Packs ranks and organism names of the nodes (objects with rank
+        and organism_name attributes) in the order of the tree index.
+        Nodes not in the tree are left out.
+        @param nodes dict(key=taxid, value=node)
+        @return tuple(ranks:numpy.int16 array, rank_names:[str],
+        name_buffer:numpy.uint8 array, name_offsets:numpy.int64 array)
+    '''
+    (ranks, rank_names) = get_rank_arrays(index, nodes)
+    names = [nodes[taxid].organism_name if rank >= 0 else ''
+             for (taxid, rank) in zip(index.taxids.tolist(), ranks.tolist())]
+    (name_buffer, name_offsets) = pack_strings(names)
+    return (ranks, rank_names, name_buffer, name_offsets)
@@ -0,0 +1,380 @@
+'''
+Array based index over the taxonomy tree.
+
+Every tax ID gets a dense index (0..n-1), and the tree structure is
+stored in numpy arrays over these indexes, so that ancestor queries
+do not have to walk the tree one parent at a time.
+'''
+import numpy
+
+class TaxIndex (object):
+    ''' Precomputed tree index enabling fast lowest common ancestor
+        queries (binary lifting).
+
+        up[k][i] is the 2^k-th ancestor of node i (root is its own
+        ancestor), so the ancestor at any distance is found in
+        O(log depth) steps.
+
+        Nodes are also numbered in DFS pre-order: descendants of node
+        i are exactly the nodes numbered pre[i]+1 .. pre[i]+size[i]-1,
+        so ancestor tests are two integer comparisons.
+    '''
+
+    # Dense index of tax IDs not present in the tree
+    NO_INDEX = -1
+
+    def __init__ (self, taxids, index_of, parent, depth, up, pre, size, root):
+        '''
+        (numpy.int32 array) taxids Tax ID of every node.
+        (numpy.int32 array) index_of Maps tax ID to node index,
+        NO_INDEX for tax IDs not in the tree.
+        (numpy.int32 array) parent Index of the parent of every node.
+        (numpy.int32 array) depth Distance of every node from the root.
+        (numpy.int32 2D array) up Binary lifting table.
+        (numpy.int32 array) pre DFS pre-order number of every node.
+        (numpy.int32 array) size Number of nodes in the subtree of
+        every node (including the node).
+        (int) root Index of the root node.
+        '''
+        self.taxids     = taxids
+        self.index_of   = index_of
+        self.parent     = parent
+        self.depth      = depth
+        self.up         = up
+        self.pre        = pre
+        self.size       = size
+        self.root       = root
+        self._preorder_nodes = None
+
+    @staticmethod
+    def from_parent_nodes (parent_nodes):
+        '''
+        @param parent_nodes dict(key=taxid, value=parent taxid),
+        root is its own parent
+        @return TaxIndex
+        '''
+        taxids = numpy.fromiter(parent_nodes.iterkeys(), dtype=numpy.int64,
+                                count=len(parent_nodes))
+        parent_taxids = numpy.fromiter(parent_nodes.itervalues(), dtype=numpy.int64,
+                                       count=len(parent_nodes))
+        return TaxIndex.build(taxids, parent_taxids)
+
+    @staticmethod
+    def build (taxids, parent_taxids):
+        ''' Creates the index from parallel arrays of tax IDs and
+            their parent tax IDs. The root is the node that is its own
+            parent. Nodes whose parent is not in the tree are attached
+            to the root.
+            @return TaxIndex
+        '''
+        taxids = numpy.asarray(taxids, dtype=numpy.int64)
+        parent_taxids = numpy.asarray(parent_taxids, dtype=numpy.int64)
+        if len(taxids) == 0:
+            raise ValueError('Cannot index an empty taxonomy tree.')
+
+        order = numpy.argsort(taxids, kind='mergesort')
+        taxids = taxids[order]
+        parent_taxids = parent_taxids[order]
+
+        index_of = numpy.empty(int(taxids[-1]) + 1, dtype=numpy.int32)
+        index_of.fill(TaxIndex.NO_INDEX)
+        index_of[taxids] = numpy.arange(len(taxids), dtype=numpy.int32)
+
+        roots = numpy.flatnonzero(taxids == parent_taxids)
+        if len(roots) == 0:
+            raise ValueError('Taxonomy tree has no root (node which is its own parent).')
+        root = int(roots[0])
+
+        known = (parent_taxids >= 0) & (parent_taxids < len(index_of))
+        parent = numpy.empty(len(taxids), dtype=numpy.int32)
+        parent.fill(TaxIndex.NO_INDEX)
+        parent[known] = index_of[parent_taxids[known]]
+        parent[parent == TaxIndex.NO_INDEX] = root
+        parent[roots] = root
+
+        depth = _get_depths(parent, root)
+        up = _get_lifting_table(parent, int(depth.max()))
+        (pre, size) = _get_preorder(parent, depth, root)
+        return TaxIndex(taxids.astype(numpy.int32), index_of, parent, depth,
+                        up, pre, size, root)
+
+    def get_node_count (self):
+        return len(self.taxids)
+
+    def get_index (self, taxid):
+        ''' @return (int) node index of the tax ID, NO_INDEX if the
+            tax ID is not in the tree
+        '''
+        if taxid is None or taxid < 0 or taxid >= len(self.index_of):
+            return self.NO_INDEX
+        return int(self.index_of[taxid])
+
+    def get_indexes (self, taxids):
+        ''' Vectorised get_index.
+            @param taxids array like of tax IDs
+            @return (numpy.int32 array) node indexes
+        '''
+        taxids = numpy.asarray(taxids, dtype=numpy.int64)
+        indexes = numpy.empty(len(taxids), dtype=numpy.int32)
+        indexes.fill(self.NO_INDEX)
+        valid = (taxids >= 0) & (taxids < len(self.index_of))
+        indexes[valid] = self.index_of[taxids[valid]]
+        return indexes
+
+    def contains (self, taxid):
+        return self.get_index(taxid) != self.NO_INDEX
+
+    def is_descendant (self, index, ancestor_index):
+        ''' Returns True if the node is a descendant of the ancestor
+            node (node is not its own descendant).
+        '''
+        start = self.pre[ancestor_index]
+        return bool(start < self.pre[index] < start + self.size[ancestor_index])
+
+    def is_descendant_matrix (self, indexes, ancestor_indexes):
+        ''' Vectorised is_descendant for every pair of nodes and
+            ancestor nodes. NO_INDEX is not a descendant of anything.
+            @return (numpy.bool_ 2D array) result[i][j] is True if
+            indexes[i] is a descendant of ancestor_indexes[j]
+        '''
+        indexes = numpy.asarray(indexes, dtype=numpy.int32)
+        ancestor_indexes = numpy.asarray(ancestor_indexes, dtype=numpy.int32)
+        pre = numpy.where(indexes == self.NO_INDEX, -1, self.pre[indexes])[:, numpy.newaxis]
+        valid = ancestor_indexes != self.NO_INDEX
+        start = numpy.where(valid, self.pre[ancestor_indexes], -1)
+        end = numpy.where(valid, start + self.size[ancestor_indexes], -1)
+        return (start < pre) & (pre < end)
+
+    def get_preorder_nodes (self):
+        ''' @return (numpy.int32 array) node index of every DFS
+            pre-order number (inverse of pre)
+        '''
+        if self._preorder_nodes is None:
+            nodes = numpy.empty(self.get_node_count(), dtype=numpy.int32)
+            nodes[self.pre] = numpy.arange(self.get_node_count(), dtype=numpy.int32)
+            self._preorder_nodes = nodes
+        return self._preorder_nodes
+
+    def get_ancestor_maximum (self, values, fill):
+        ''' Computes for every node the maximum value over its
+            ancestors (node is not its own ancestor), in one top-down
+            sweep, one tree level at a time.
+            @param values (numpy array) value of every node
+            @param fill value of nodes without ancestors (root)
+            @return (numpy array) maximum value over the ancestors of
+            every node, at least fill
+        '''
+        maximum = numpy.empty_like(values)
+        maximum.fill(fill)
+        order = numpy.argsort(self.depth, kind='mergesort')
+        level_starts = numpy.searchsorted(self.depth[order],
+                                          numpy.arange(1, int(self.depth.max()) + 2))
+        for (start, end) in zip(level_starts[:-1], level_starts[1:]):
+            nodes = order[start:end]
+            parents = self.parent[nodes]
+            maximum[nodes] = numpy.maximum(maximum[parents], values[parents])
+        return maximum
+
+    def get_marked_ancestors (self, marked):
+        ''' Finds the closest marked ancestor of every node (node is
+            its own ancestor), one tree level at a time.
+            @param marked (numpy.bool_ array) True for marked nodes
+            @return (numpy.int32 array) node index of the closest
+            marked ancestor of every node, NO_INDEX if there is none
+        '''
+        ancestor = numpy.where(marked, numpy.arange(len(marked), dtype=numpy.int32),
+                               numpy.int32(self.NO_INDEX)).astype(numpy.int32)
+        order = numpy.argsort(self.depth, kind='mergesort')
+        level_starts = numpy.searchsorted(self.depth[order],
+                                          numpy.arange(1, int(self.depth.max()) + 2))
+        for (start, end) in zip(level_starts[:-1], level_starts[1:]):
+            nodes = order[start:end]
+            nodes = nodes[~marked[nodes]]
+            ancestor[nodes] = ancestor[self.parent[nodes]]
+        return ancestor
+
+    def get_ancestor (self, index, distance):
+        ''' @return (int) index of the ancestor distance levels above
+            the node (root if the node is not that deep)
+        '''
+        up = self.up
+        level = 0
+        while distance:
+            if distance & 1:
+                index = up[level, index]
+            distance >>= 1
+            level += 1
+        return int(index)
+
+    def lca_index (self, index_a, index_b):
+        ''' Lowest common ancestor of two nodes.
+            @return (int) node index of the LCA
+        '''
+        depth = self.depth
+        if depth[index_a] < depth[index_b]:
+            (index_a, index_b) = (index_b, index_a)
+        index_a = self.get_ancestor(index_a, int(depth[index_a] - depth[index_b]))
+        if index_a == index_b:
+            return index_a
+        up = self.up
+        for level in xrange(len(up) - 1, -1, -1):
+            ancestor_a = up[level, index_a]
+            ancestor_b = up[level, index_b]
+            if ancestor_a != ancestor_b:
+                index_a = ancestor_a
+                index_b = ancestor_b
+        return int(up[0, index_a])
+
+    def lca_indexes (self, indexes_a, indexes_b):
+        ''' Vectorised lca_index over pairs of nodes.
+            @return (numpy.int32 array) node indexes of the LCAs
+        '''
+        a = numpy.array(indexes_a, dtype=numpy.int32)
+        b = numpy.array(indexes_b, dtype=numpy.int32)
+        swap = self.depth[a] < self.depth[b]
+        (a[swap], b[swap]) = (b[swap], a[swap])
+        distance = self.depth[a] - self.depth[b]
+        up = self.up
+        for level in xrange(len(up)):
+            jump = ((distance >> level) & 1).astype(bool)
+            a[jump] = up[level][a[jump]]
+        for level in xrange(len(up) - 1, -1, -1):
+            ancestor_a = up[level][a]
+            ancestor_b = up[level][b]
+            differ = ancestor_a != ancestor_b
+            a[differ] = ancestor_a[differ]
+            b[differ] = ancestor_b[differ]
+        return numpy.where(a == b, a, up[0][a]).astype(numpy.int32)
+
+    def lca_of_indexes (self, indexes):
+        ''' Lowest common ancestor of a list of nodes. It is the LCA of
+            the nodes visited first and last in DFS pre-order, so only
+            one pairwise query is needed.
+            @return (int) node index of the LCA
+        '''
+        if len(indexes) > 16:
+            return self.lca_of_index_array(numpy.asarray(indexes, dtype=numpy.int32))
+        pre = self.pre
+        first = last = indexes[0]
+        (first_pre, last_pre) = (pre[first], pre[first])
+        for index in indexes[1:]:
+            index_pre = pre[index]
+            if index_pre < first_pre:
+                (first, first_pre) = (index, index_pre)
+            elif index_pre > last_pre:
+                (last, last_pre) = (index, index_pre)
+        if first == last:
+            return int(first)
+        return self.lca_index(first, last)
+
+    def lca_of_index_array (self, indexes):
+        ''' Vectorised lca_of_indexes.
+            @param indexes (numpy.int32 array) non empty
+            @return (int) node index of the LCA
+        '''
+        pre = self.pre[indexes]
+        return self.lca_index(indexes[numpy.argmin(pre)], indexes[numpy.argmax(pre)])
+
+    def lca_of_groups (self, offsets, indexes):
+        ''' Vectorised lca_of_indexes over many lists of nodes, stored
+            in CSR layout: list i is indexes[offsets[i]:offsets[i+1]].
+            The first and the last node of every list in DFS pre-order
+            are found with reduceat, and all the pairwise LCAs are
+            then computed at once.
+            @param offsets (numpy.int64 array) len(lists) + 1 offsets
+            @param indexes (numpy.int32 array) node indexes, NO_INDEX
+            entries are skipped
+            @return (numpy.int32 array) node index of the LCA of every
+            list, NO_INDEX for lists without nodes
+        '''
+        offsets = numpy.asarray(offsets, dtype=numpy.int64)
+        indexes = numpy.asarray(indexes, dtype=numpy.int32)
+        node_count = self.get_node_count()
+        valid = indexes != self.NO_INDEX
+        pre = self.pre[indexes]
+        first_pre = numpy.where(valid, pre, node_count)
+        last_pre = numpy.where(valid, pre, -1)
+
+        list_count = len(offsets) - 1
+        first = numpy.empty(list_count, dtype=numpy.int64)
+        first.fill(node_count)
+        last = numpy.empty(list_count, dtype=numpy.int64)
+        last.fill(-1)
+        # reduceat does not support empty segments
+        nonempty = numpy.flatnonzero(numpy.diff(offsets) > 0)
+        if len(nonempty):
+            starts = offsets[nonempty]
+            first[nonempty] = numpy.minimum.reduceat(first_pre, starts)
+            last[nonempty] = numpy.maximum.reduceat(last_pre, starts)
+
+        found = last >= 0
+        lca = numpy.empty(list_count, dtype=numpy.int32)
+        lca.fill(self.NO_INDEX)
+        nodes = self.get_preorder_nodes()
+        lca[found] = self.lca_indexes(nodes[first[found]], nodes[last[found]])
+        return lca
+
+    def lca (self, taxids):
+        ''' Lowest common ancestor of tax IDs, all of which must be
+            in the tree.
+            @return (int) tax ID of the LCA
+        '''
+        return int(self.taxids[self.lca_of_indexes([self.get_index(taxid) for taxid in taxids])])
+
+
+def _get_depths (parent, root):
+    ''' Computes the distance of every node from the root by pointer
+        jumping (O(n log depth)).
+        @raise ValueError if there is a cycle not passing the root
+    '''
+    depth = numpy.ones(len(parent), dtype=numpy.int32)
+    depth[root] = 0
+    ancestor = parent.copy()
+    for i in xrange(64):
+        if numpy.all(ancestor == root):
+            return depth
+        depth += depth[ancestor] * (ancestor != root)
+        ancestor = ancestor[ancestor]
+    raise ValueError('Taxonomy tree contains a cycle.')
+
+def _get_preorder (parent, depth, root):
+    ''' Numbers the nodes in DFS pre-order (children visited in order
+        of their indexes), one tree level at a time.
+        @return tuple(pre:numpy.int32 array, size:numpy.int32 array)
+    '''
+    node_count = len(parent)
+    # nodes sorted by level, and by parent within a level
+    order = numpy.lexsort((numpy.arange(node_count), parent, depth))
+    order = order[order != root]
+    level_starts = numpy.searchsorted(depth[order], numpy.arange(1, int(depth.max()) + 2))
+    levels = [order[start:end] for (start, end) in zip(level_starts[:-1], level_starts[1:])]
+
+    # subtree sizes, bottom up
+    size = numpy.ones(node_count, dtype=numpy.int64)
+    for nodes in reversed(levels):
+        size += numpy.bincount(parent[nodes], weights=size[nodes],
+                               minlength=node_count).astype(numpy.int64)
+
+    # pre-order numbers, top down: a node comes right after its parent
+    # and the subtrees of its preceding siblings
+    pre = numpy.zeros(node_count, dtype=numpy.int64)
+    for nodes in levels:
+        if len(nodes) == 0:
+            continue
+        parents = parent[nodes]
+        preceding = numpy.cumsum(size[nodes]) - size[nodes]
+        first_sibling = numpy.flatnonzero(numpy.r_[True, parents[1:] != parents[:-1]])
+        group_sizes = numpy.diff(numpy.r_[first_sibling, len(nodes)])
+        preceding -= numpy.repeat(preceding[first_sibling], group_sizes)
+        pre[nodes] = pre[parents] + 1 + preceding
+    return (pre.astype(numpy.int32), size.astype(numpy.int32))
+
+def _get_lifting_table (parent, max_depth):
+    ''' @return (numpy.int32 2D array) up[k][i] = 2^k-th ancestor of i
+    '''
+    levels = max(1, int(max_depth).bit_length())
+    up = numpy.empty((levels, len(parent)), dtype=numpy.int32)
+    up[0] = parent
+    for level in xrange(1, levels):
+        up[level] = up[level-1][up[level-1]]
+    return up
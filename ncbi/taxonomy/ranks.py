@@ -26,4 +26,13 @@ ranks = { 'superkingdom'        : 0,
           'subspecies'          : 25,
           'varietas'            : 26,
           'forma'               : 27,
-          'no rank'             : 28 }
\ No newline at end of file
+          'no rank'             : 28 }
+
+# Ranks with precomputed ancestor tables in TaxTree, from the lowest
+main_ranks = ['species',
+              'genus',
+              'family',
+              'order',
+              'class',
+              'phylum',
+              'superkingdom']
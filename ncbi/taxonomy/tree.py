@@ -1,8 +1,25 @@
 from  collections       import defaultdict
 import os,sys
+import tempfile
 from utils.progressbar import print_progress
+from ncbi.taxonomy.index import TaxIndex
+from ncbi.taxonomy.compact import ParentNodesView, ChildNodesView, NodesView, RelevantTaxView, \
+                                  get_child_arrays, get_node_arrays, get_rank_arrays
+from ncbi.taxonomy.ranks import main_ranks
+from utils.binfile import write_arrays, read_arrays, pack_strings, StringTable
 
-class TaxTree ():
+import numpy
+
+SNAPSHOT_FILE_TYPE = 'taxtree'
+SHARED_MEMORY_DIR = '/dev/shm'
+
+# file name and environment variable with the location of every
+# taxonomy file type
+TAXONOMY_FILES = {'parent2child'  : ('ncbi_tax_tree', 'BINNER_TAX_TREE'),
+                  'taxdata'       : ('taxid2namerank', 'BINNER_TAX_DATA')}
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data')
+
+class TaxTree (object):
     ''' Loads the NCBI taxonomy tree, creates both
         parent-child and child-parent relations,
         enables parent-child relationship testing and
@@ -16,22 +33,187 @@ class TaxTree ():
             :param parent2child_fname location of the ncbi taxonomy tree file
             :param tax_nodes_fname location of the file containing taxid,
             organism name and organism rank for each taxid in the tree.
+            Files which are not given are located by _h_find_taxnode_file.
         '''
 
-        if not parent2child_fname:
-            parent2child_fname = self._h_find_taxnode_file('parent2child')
-        self.load(parent2child_fname)
-        if not tax_nodes_fname:
-            tax_nodes_fname = self._h_find_taxnode_file('taxdata')
-        self.load_taxonomy_data(tax_nodes_fname)
+        self.load(self._h_find_taxnode_file('parent2child', parent2child_fname))
+        self.load_taxonomy_data(self._h_find_taxnode_file('taxdata', tax_nodes_fname))
 
         #--------- RELEVANT TAXONOMY ASSIGNMENTS ----------#
         self._h_set_relevant_taxonomy_assignments()
         self._h_map_taxids_to_relevant_tax_nodes()
+        self.tax2relevantTax = self._h_get_tax2relevantTax()
+
+    def compact (self):
+        ''' Replaces the tree dictionaries (parent_nodes, child_nodes,
+            nodes, tax2relevantTax) with array backed views of the same
+            content (see ncbi.taxonomy.compact), which take a fraction
+            of the memory. Views are read only.
+        '''
+        (child_offsets, children) = get_child_arrays(self.index)
+        (ranks, rank_names, name_buffer, name_offsets) = get_node_arrays(self.index, self.nodes)
+        self._h_set_views(child_offsets, children, ranks, rank_names,
+                          StringTable(name_buffer, name_offsets))
+
+    def save_snapshot (self, snapshot_fname):
+        ''' Saves the loaded tree into a binary snapshot file,
+            which load_snapshot maps back into memory without parsing.
+            Snapshot holds the tree index arrays (see TaxIndex), CSR
+            child lists, rank codes and packed organism names of the
+            nodes, the relevant categories (including registered
+            category sets) and the rank ancestor tables of
+            ranks.main_ranks.
+            Only names of the tax IDs present in the tree are saved.
+
+            :param snapshot_fname path of the snapshot file
+        '''
+        index = self.index
+        (child_offsets, children) = get_child_arrays(index)
+        (ranks, rank_names, name_buffer, name_offsets) = get_node_arrays(index, self.nodes)
+        arrays = {'taxids'          : index.taxids,
+                  'index_of'        : index.index_of,
+                  'parent'          : index.parent,
+                  'depth'           : index.depth,
+                  'up'              : index.up,
+                  'pre'             : index.pre,
+                  'size'            : index.size,
+                  'child_offsets'   : child_offsets,
+                  'children'        : children,
+                  'ranks'           : ranks,
+                  'name_buffer'     : name_buffer,
+                  'name_offsets'    : name_offsets,
+                  'relevant_categories' : self.relevant_categories,
+                  'category_taxids' : self.category_taxids,
+                  'rank_ancestors'  : numpy.array([self.get_rank_ancestors(rank)
+                                                   for rank in main_ranks])}
+        attributes = {'root'       : self.root,
+                      'root_index' : index.root,
+                      'ranks'      : rank_names,
+                      'main_ranks' : main_ranks,
+                      'category_sets' : self.category_sets}
+        write_arrays(snapshot_fname, SNAPSHOT_FILE_TYPE, arrays, attributes)
+
+    @staticmethod
+    def load_snapshot (snapshot_fname):
+        ''' Loads the tree from a snapshot created by save_snapshot.
+            Arrays are memory mapped, so loading takes only as long
+            as reading the snapshot header. The loaded tree is compact
+            (see compact).
+
+            :param snapshot_fname path of the snapshot file
+            :rtype TaxTree
+            :raises utils.binfile.BinaryFileError if the file is not
+            a tax tree snapshot
+        '''
+        (arrays, attributes) = read_arrays(snapshot_fname, SNAPSHOT_FILE_TYPE)
+        tax_tree = TaxTree.__new__(TaxTree)
+        tax_tree.snapshot_fname = snapshot_fname
+        tax_tree.root = attributes['root']
+        tax_tree.index = TaxIndex(arrays['taxids'], arrays['index_of'], arrays['parent'],
+                                  arrays['depth'], arrays['up'], arrays['pre'],
+                                  arrays['size'], attributes['root_index'])
+        tax_tree.relevant_categories = arrays['relevant_categories']
+        tax_tree.category_taxids = arrays['category_taxids']
+        tax_tree.rank_ancestors = dict((str(rank), rank_ancestors) for (rank, rank_ancestors)
+                                       in zip(attributes['main_ranks'], arrays['rank_ancestors']))
+        tax_tree._h_set_views(arrays['child_offsets'], arrays['children'], arrays['ranks'],
+                              [str(rank) for rank in attributes['ranks']],
+                              StringTable(arrays['name_buffer'], arrays['name_offsets']))
+        tax_tree._h_set_relevant_taxonomy_assignments()
+        tax_tree.category_sets = [[str(name), taxids] for (name, taxids)
+                                  in attributes['category_sets']]
+        return tax_tree
+
+    @staticmethod
+    def from_taxdump (nodes_dump, names_dump):
+        ''' Loads the tree directly from the NCBI taxonomy dump files
+            (nodes.dmp and names.dmp from the taxdump archive), without
+            creating ncbi_tax_tree and taxid2namerank files first.
+            Only scientific names are kept. The loaded tree is compact
+            (see compact).
+
+            :param nodes_dump path to nodes.dmp
+            :param names_dump path to names.dmp
+            :rtype TaxTree
+        '''
+        from ncbi.db.ncbitax_from_file import loadNcbiNodeArrays, loadNcbiNameArrays
+        (taxids, parent_taxids, node_ranks) = loadNcbiNodeArrays(nodes_dump)
+        index = TaxIndex.build(taxids, parent_taxids)
+
+        # ranks and names in the order of the tree index
+        (rank_names, rank_codes) = numpy.unique(numpy.array(node_ranks), return_inverse=True)
+        ranks = numpy.empty(index.get_node_count(), dtype=numpy.int16)
+        ranks[index.get_indexes(taxids)] = rank_codes
+        names = [''] * index.get_node_count()
+        (name_taxids, scientific_names) = loadNcbiNameArrays(names_dump)
+        for (i, name) in zip(index.get_indexes(name_taxids).tolist(), scientific_names):
+            if i != TaxIndex.NO_INDEX:
+                names[i] = name
+        (name_buffer, name_offsets) = pack_strings(names)
+
+        tax_tree = TaxTree.__new__(TaxTree)
+        tax_tree.index = index
+        tax_tree.root = int(index.taxids[index.root])
+        tax_tree.rank_ancestors = {}
+        (child_offsets, children) = get_child_arrays(index)
+        tax_tree._h_set_relevant_taxonomy_assignments()
+        tax_tree._h_map_taxids_to_relevant_tax_nodes()
+        tax_tree._h_set_views(child_offsets, children, ranks, rank_names.tolist(),
+                              StringTable(name_buffer, name_offsets))
+        return tax_tree
+
+    def share (self, directory=None):
+        ''' Creates a copy of the tree which can be shared between
+            processes: the tree is saved as a snapshot into shared
+            memory (/dev/shm, or the temporary directory if there is
+            none) and loaded back memory mapped. Pickled shared tree
+            carries only the snapshot path, so worker processes
+            (e.g. of a multiprocessing.Pool) attach to the same read
+            only pages instead of receiving their own copy.
+            Snapshot file is removed by release.
+
+            :param directory where to create the snapshot file
+            :rtype TaxTree
+        '''
+        if directory is None:
+            directory = SHARED_MEMORY_DIR if os.path.isdir(SHARED_MEMORY_DIR) \
+                        else tempfile.gettempdir()
+        (fd, snapshot_fname) = tempfile.mkstemp(prefix='taxtree-', suffix='.snapshot',
+                                                dir=directory)
+        os.close(fd)
+        try:
+            self.save_snapshot(snapshot_fname)
+            shared_tree = TaxTree.load_snapshot(snapshot_fname)
+        except:
+            os.remove(snapshot_fname)
+            raise
+        shared_tree.owns_snapshot = True
+        return shared_tree
+
+    def release (self):
+        ''' Removes the snapshot file of a tree created by share.
+            Processes which already attached to the tree can still
+            use it, new ones cannot.
+        '''
+        if self.__dict__.pop('owns_snapshot', False):
+            os.remove(self.snapshot_fname)
+
+    def __getstate__ (self):
+        # trees loaded from a snapshot are pickled as the snapshot path
+        snapshot_fname = self.__dict__.get('snapshot_fname')
+        if snapshot_fname is None:
+            return self.__dict__
+        return {'snapshot_fname' : snapshot_fname}
+
+    def __setstate__ (self, state):
+        if state.keys() == ['snapshot_fname']:
+            state = TaxTree.load_snapshot(state['snapshot_fname']).__dict__
+        self.__dict__.update(state)
 
     def load (self, parent2child_fname):
         self.parent_nodes   = self._h_get_tax_nodes(parent2child_fname)
         self.child_nodes    = self._h_populate_child_nodes()
+        self.index          = TaxIndex.from_parent_nodes(self.parent_nodes)
 
     def load_taxonomy_data(self, tax_nodes_fname):
         '''
@@ -53,6 +235,7 @@ class TaxTree ():
             node = TaxNode(org_name, rank)
             self.nodes[int(taxid)] = node
         tax_nodes_file.close()
+        self.rank_ancestors = {}
 
     def is_child (self, child_taxid, parent_taxid):
         ''' Test if child_taxid is child node of parent_taxid
@@ -64,15 +247,29 @@ class TaxTree ():
         if parent_taxid == self.root:
             return True
 
-        tmp_parent_taxid = child_taxid
-        while True:
-            if not self.parent_nodes.has_key(tmp_parent_taxid):
-                return False
-            tmp_parent_taxid = self.parent_nodes[tmp_parent_taxid]
-            if tmp_parent_taxid == self.root:
-                return False
-            if tmp_parent_taxid == parent_taxid:
-                return True
+        child_index = self.index.get_index(child_taxid)
+        parent_index = self.index.get_index(parent_taxid)
+        if child_index == TaxIndex.NO_INDEX or parent_index == TaxIndex.NO_INDEX:
+            return False
+        return self.index.is_descendant(child_index, parent_index)
+
+    def is_child_batch (self, child_taxids, parent_taxids):
+        ''' Vectorised is_child, tests every child tax ID against
+            every parent tax ID.
+            :param child_taxids list of tax IDs (None is allowed)
+            :param parent_taxids list of tax IDs
+            :rtype numpy.bool_ 2D array: result[i][j] is True if
+            child_taxids[i] is child node of parent_taxids[j]
+        '''
+        child_taxids = numpy.array([-1 if taxid is None else taxid for taxid in child_taxids],
+                                   dtype=numpy.int64)
+        parent_taxids = numpy.array([-1 if taxid is None else taxid for taxid in parent_taxids],
+                                    dtype=numpy.int64)
+        is_child = self.index.is_descendant_matrix(self.index.get_indexes(child_taxids),
+                                                   self.index.get_indexes(parent_taxids))
+        is_child[:, parent_taxids == self.root] = True
+        is_child &= child_taxids[:, numpy.newaxis] != parent_taxids
+        return is_child
 
     def find_lca (self, taxid_list):
         ''' Finds the lowest common ancestor of a list of nodes
@@ -82,56 +279,70 @@ class TaxTree ():
             Returns:
                 (int): tax_id of LCA
         '''
-        # Check if all nodes exist (and sum up blast scores)
+        # Check if all nodes exist, filter out invalid tax_ids
+        indexes = []
         for taxid in taxid_list:
-            if taxid != self.root and not self.parent_nodes.has_key(taxid):
-                try:
-                    raise Exception ("Key error, no element with id " + str(taxid))
-                except Exception, e:
-                    sys.stderr.write("{0}\n".format(e))
-
-        # Filter out invalid tax_ids - those without parents
-        taxid_list = filter(lambda tax_id: tax_id == self.root or self.parent_nodes.has_key(tax_id) , taxid_list)
+            index = self.index.get_index(taxid)
+            if index == TaxIndex.NO_INDEX:
+                sys.stderr.write("Key error, no element with id {0}\n".format(taxid))
+                continue
+            indexes.append(index)
 
         # Check if list is empty
-        if len(taxid_list) == 0:
-            try:
-                raise Exception ("taxid_list is empty, cannot find LCA!")
-            except Exception:
-                sys.stderr.write("{0}\n".format(e))
-                return 1 # Assign to root
+        if len(indexes) == 0:
+            sys.stderr.write("taxid_list is empty, cannot find LCA!\n")
+            return 1 # Assign to root
 
-        # each of the visited nodes remembers how many
-        # child nodes traversed it
-        self.num_visited = defaultdict(int)
+        # fold of pairwise LCAs over the precomputed index
+        self.lca_root = int(self.index.taxids[self.index.lca_of_indexes(indexes)])
+        return self.lca_root
 
-        current_taxids  = taxid_list
-        num_of_nodes    = len(current_taxids)
 
-        # now find the lowest common ancestor
-        while (True):
-
-            parent_nodes = []
-            for taxid in current_taxids:
-                # root node must not add itself to parent list
-                if   taxid != self.root:    parent_taxid = self.parent_nodes[taxid]
-                else:                       parent_taxid = None
-                # if parent exists, append him to parent list
-                # duplicates ensure that every traversal will count
-                if parent_taxid:            parent_nodes.append(parent_taxid)
-
-                # Check for LCA
-                self.num_visited[taxid] += 1
-                if self.num_visited[taxid] == num_of_nodes:
-                    self.lca_root = taxid
-                    return taxid
-
-            # refresh current nodes
-            current_taxids = parent_nodes
+    def batch_lca (self, offsets, taxids):
+        ''' Finds the lowest common ancestor of many lists of tax IDs
+            at once (e.g. tax IDs of the alignments of every read).
+            Lists are given in CSR layout: list i is
+            taxids[offsets[i]:offsets[i+1]]. As in find_lca, tax IDs
+            not in the tree are skipped and lists without valid
+            tax IDs are assigned to root (1).
 
+            Args:
+                offsets (numpy.int64 array): len(lists) + 1 offsets
+                taxids (numpy.int64 array): tax IDs of all the lists
+            Returns:
+                (numpy.int64 array): tax_id of LCA of every list
+        '''
+        index = self.index
+        lca = index.lca_of_groups(offsets, index.get_indexes(taxids))
+        return numpy.where(lca == TaxIndex.NO_INDEX, 1, index.taxids[lca]).astype(numpy.int64)
 
     def get_relevant_taxid (self, tax_id):
-        return self.tax2relevantTax.get(tax_id, -1)
+        index = self.index.get_index(tax_id)
+        if index == TaxIndex.NO_INDEX:
+            return -1
+        category = self.relevant_categories[index]
+        return -1 if category < 0 else int(self.category_taxids[category])
+
+    def register_category_set (self, name, taxids):
+        ''' Registers a custom set of relevant categories (e.g. host
+            organisms of a study). Descendants of the category nodes
+            are tagged with them (see get_relevant_taxid), overriding
+            the categories of previously registered sets. Registering
+            a set under an existing name replaces the old set.
+            Default sets are 'microbes' and 'potential_hosts'.
+
+            :param name (str) name of the category set
+            :param taxids list of tax IDs of category nodes
+        '''
+        self.category_sets = [[set_name, set_taxids] for (set_name, set_taxids)
+                              in self.category_sets if set_name != name]
+        self.category_sets.append([name, [int(taxid) for taxid in taxids]])
+        self._h_map_taxids_to_relevant_tax_nodes()
+        if isinstance(self.tax2relevantTax, RelevantTaxView):
+            self.tax2relevantTax = RelevantTaxView(self.index, self.relevant_categories,
+                                                   self.category_taxids)
+        else:
+            self.tax2relevantTax = self._h_get_tax2relevantTax()
 
     def get_lineage(self,tax_id):
         lineage = []
@@ -143,6 +354,63 @@ class TaxTree ():
         return reversed(lineage)
 
     def get_parent_with_rank(self, tax_id, rank):
+        ''' Finds the closest ancestor of the node (including the node)
+            with the given rank, using the rank ancestor table (see
+            get_rank_ancestors).
+
+            :rtype int: tax ID of the ancestor, 0 if there is none,
+            -1 if the tax ID has no taxonomy data
+        '''
+        index = self.index.get_index(tax_id)
+        if index == TaxIndex.NO_INDEX:
+            return self._h_walk_to_parent_with_rank(tax_id, rank)
+        return int(self.get_rank_ancestors(rank)[index])
+
+    def get_parents_with_rank(self, tax_ids, rank):
+        ''' Vectorised get_parent_with_rank.
+
+            :param tax_ids array like of tax IDs (None is allowed)
+            :rtype numpy.int32 array: tax IDs of the ancestors, 0 where
+            there is none, -1 for tax IDs without taxonomy data or not
+            in the tree
+        '''
+        tax_ids = numpy.array([-1 if tax_id is None else tax_id for tax_id in tax_ids],
+                              dtype=numpy.int64)
+        indexes = self.index.get_indexes(tax_ids)
+        return numpy.where(indexes == TaxIndex.NO_INDEX, -1,
+                           self.get_rank_ancestors(rank)[indexes]).astype(numpy.int32)
+
+    def get_rank_ancestors(self, rank):
+        ''' Returns the rank ancestor table of the rank, created on
+            first use (tables of ranks.main_ranks are also stored in
+            tree snapshots).
+
+            :rtype numpy.int32 array: for every node of the tree index,
+            tax ID of the closest ancestor with the rank (node is its
+            own ancestor), 0 if there is none (root never counts),
+            -1 for nodes without taxonomy data
+        '''
+        rank_ancestors = self.rank_ancestors.get(rank)
+        if rank_ancestors is None:
+            rank_ancestors = self._h_create_rank_ancestors(rank)
+            self.rank_ancestors[rank] = rank_ancestors
+        return rank_ancestors
+
+    def _h_create_rank_ancestors(self, rank):
+        index = self.index
+        (node_ranks, rank_names) = get_rank_arrays(index, self.nodes)
+        if rank in rank_names:
+            marked = node_ranks == rank_names.index(rank)
+        else:
+            marked = numpy.zeros(index.get_node_count(), dtype=bool)
+        marked[index.root] = False
+        ancestors = index.get_marked_ancestors(marked)
+        rank_ancestors = numpy.where(ancestors == TaxIndex.NO_INDEX, 0,
+                                     index.taxids[ancestors]).astype(numpy.int32)
+        rank_ancestors[node_ranks < 0] = -1
+        return rank_ancestors
+
+    def _h_walk_to_parent_with_rank(self, tax_id, rank):
         if tax_id not in self.nodes:
 	    return -1
         parent = 0
@@ -170,20 +438,32 @@ class TaxTree ():
         return int(key), int(value)
 
 
-    def _h_find_taxnode_file(self, file_type):
-        ''' Searches recursively through the current
-            working directory to find the ncbi_tax_tree file.
+    def _h_find_taxnode_file(self, file_type, fname=None):
+        ''' Locates the ncbi_tax_tree (parent2child) or
+            taxid2namerank (taxdata) file. The first given of
+            * the explicit location (fname)
+            * the environment variable (BINNER_TAX_TREE/BINNER_TAX_DATA)
+            * the default location (DEFAULT_DATA_DIR, next to this module)
+            is used. The file system is never searched.
+            @raise IOError if the file does not exist
         '''
-        if file_type == 'parent2child':
-            for root, dirs, files in os.walk (os.getcwd()):
-                if 'ncbi_tax_tree' in files:
-                    return root + ''.join(dirs) + '/ncbi_tax_tree'
-        elif file_type == 'taxdata':
-            for root, dirs, files in os.walk (os.getcwd()):
-                if 'taxid2namerank' in files:
-                    return root + ''.join(dirs) + '/taxid2namerank'
-        else:
+        if file_type not in TAXONOMY_FILES:
             raise ValueError('Internal error: looking for %s file type failed. No such file type supported.' % file_type)
+        (default_fname, env_variable) = TAXONOMY_FILES[file_type]
+        default_path = os.path.join(DEFAULT_DATA_DIR, default_fname)
+
+        if fname:
+            path = os.path.expanduser(fname)
+        elif os.environ.get(env_variable):
+            path = os.path.expanduser(os.environ[env_variable])
+        else:
+            path = default_path
+        if not os.path.isfile(path):
+            raise IOError('Taxonomy file %s does not exist. The file is taken from the first '
+                          'given of: explicit location (%s), $%s (%s), default location (%s).'
+                          % (path, fname or 'not given', env_variable,
+                             os.environ.get(env_variable) or 'not set', default_path))
+        return path
 
     def _h_populate_child_nodes (self):
         ''' Populates child nodes from parent to child
@@ -229,44 +509,48 @@ class TaxTree ():
                                 self.microsporidia,
                                 self.neocallimastigomycota]
 
+        # relevant category sets, later sets override earlier ones
+        self.category_sets = [['microbes', self.microbes],
+                              ['potential_hosts', self.potential_hosts]]
 
     def _h_map_taxids_to_relevant_tax_nodes(self):
-        host_nodes = list(self.potential_hosts)
-        microbe_nodes = list(self.microbes)
-
-        self.tax2relevantTax = {}
-        for microbe_node in self.microbes:
-            microbe_children = self._h_list_all_children(microbe_node)
-            for child in microbe_children:
-                self.tax2relevantTax[child] = microbe_node
-
-        for host_node in self.potential_hosts:
-            host_children = self._h_list_all_children(host_node)
-            for child in host_children:
-                self.tax2relevantTax[child] = host_node
-
-        tagged_nodes    = self.tax2relevantTax.keys()
-        all_nodes       = self.parent_nodes.keys()
-        untagged_nodes  = set(all_nodes).difference(tagged_nodes)
-        for node in untagged_nodes:
-            self.tax2relevantTax[node] = -1
-
-    def _h_list_all_children(self, tax_id):
-        if not self.child_nodes.has_key(tax_id):
-            return []
-        one_step_children = self.child_nodes[tax_id]
-        all_children = []
-        while (True):
-            if not one_step_children:
-                break
-            new_one_step_children = []
-            all_children.extend(one_step_children)
-            for child in one_step_children:
-                if self.child_nodes.has_key(child):
-                    new_one_step_children.extend(self.child_nodes[child])
-            one_step_children = new_one_step_children
-        return all_children
+        ''' Tags every node with the category (node of a category
+            set) it descends from, in a single top-down sweep over
+            the tree. If a node descends from several categories,
+            the one listed last wins, so later category sets override
+            earlier ones (potential hosts override microbes).
+            After invoking this method, following parameters will be set:
+            * category_taxids (numpy.int32 array) tax ID of every category
+            * relevant_categories (numpy.int16 array) category of every
+              node of the tree index, -1 for untagged nodes
+        '''
+        index = self.index
+        category_taxids = numpy.array([taxid for (name, taxids) in self.category_sets
+                                       for taxid in taxids], dtype=numpy.int32)
+        # categories listed later take precedence
+        categories = numpy.empty(index.get_node_count(), dtype=numpy.int16)
+        categories.fill(-1)
+        category_indexes = index.get_indexes(category_taxids)
+        in_tree = category_indexes != TaxIndex.NO_INDEX
+        categories[category_indexes[in_tree]] = numpy.flatnonzero(in_tree)
+        self.category_taxids = category_taxids
+        self.relevant_categories = index.get_ancestor_maximum(categories, -1)
+
+    def _h_get_tax2relevantTax(self):
+        ''' @return dict(key=taxid, value=relevant taxid), -1 for
+            untagged nodes
+        '''
+        # category -1 picks the appended -1
+        relevant_taxids = numpy.r_[self.category_taxids, -1][self.relevant_categories]
+        return dict(zip(self.index.taxids.tolist(), relevant_taxids.tolist()))
 
+    def _h_set_views(self, child_offsets, children, ranks, rank_names, names):
+        index = self.index
+        self.parent_nodes       = ParentNodesView(index)
+        self.child_nodes        = ChildNodesView(index, child_offsets, children)
+        self.nodes              = NodesView(index, ranks, rank_names, names, TaxNode)
+        self.tax2relevantTax    = RelevantTaxView(index, self.relevant_categories,
+                                                  self.category_taxids)
 
 
 class TaxNode (object):
@@ -282,7 +566,3 @@ class TaxNode (object):
         self.organism_name = organism_name
         self.rank = rank
         self.score = score
-
-
-
-
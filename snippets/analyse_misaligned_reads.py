@@ -7,7 +7,7 @@ sys.path.append(os.getcwd())
 from utils.argparser import DefaultBinnerArgParser
 from ncbi.db.data_access import DataAccess
 from ncbi.taxonomy.tree import TaxTree
-from data.containers.read import ReadContainer
+from data.containers.table import TableReadContainer
 
 import filters.host as host_filter
 
@@ -54,7 +54,7 @@ def main():
     print '1. Loading tax tree...'
     start = time.time()
 
-    tax_tree = TaxTree()
+    tax_tree = TaxTree(args.tax_tree, args.tax_data)
 
     end = time.time()
     print("done: {0:.2f} sec".format(end - start))
@@ -64,8 +64,9 @@ def main():
     print '2. Loading alignment file...'
     start = time.time()
 
-    read_container = ReadContainer()
-    read_container.load_alignment_data(args.alignment_file)
+    read_container = TableReadContainer()
+    read_container.load_alignment_data(args.alignment_file, workers=args.workers,
+                                       cache_fname=args.alignment_cache)
     #---SET TAXIDS FOR ALL ALIGNMENTS--#
     read_container.set_taxids(dataAccess)
 
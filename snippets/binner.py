@@ -9,8 +9,9 @@ sys.path.append(os.getcwd())
 from utils.argparser import DefaultBinnerArgParser
 from ncbi.db.data_access import DataAccess
 from ncbi.taxonomy.tree import TaxTree
-from data.containers.read import ReadContainer
+from data.containers.table import TableReadContainer
 from data.containers.record import RecordContainer
+from ncbi.db.record_cache import RecordCache
 from data.containers.cdsaln import CdsAlnContainer
 import filters.host as host_filter
 import filters.readprocessing as rstate
@@ -62,15 +63,16 @@ def main():
 
     #-------- TAXONOMY TREE -----------#
     print '1. Loading tax tree...'
-    tax_tree = TaxTree()
+    tax_tree = TaxTree(args.tax_tree, args.tax_data)
     # tax_tree.load_taxonomy_data(dataAccess)
     print 'done.'
 
     #----------------------------------#
     #------- ALIGNMENT DATA SOURCE ----#
     print '2. Loading alignment file...'
-    read_container = ReadContainer()
-    read_container.load_alignment_data(args.input)
+    read_container = TableReadContainer()
+    read_container.load_alignment_data(args.input, workers=args.workers,
+                                       cache_fname=args.alignment_cache)
     #---SET TAXIDS FOR ALL ALIGNMENTS--#
     read_container.set_taxids(dataAccess)
     # Remember total number of reads
@@ -110,7 +112,12 @@ def main():
     print '4. Loading referenced records...'
     record_container = RecordContainer()
     record_container.set_db_access(dataAccess)
-    record_container.populate(read_container.fetch_all_reads_versions(), table='cds')
+    if args.record_cache:
+        record_container.set_record_cache(RecordCache(args.record_cache,
+                                                      args.record_cache_size << 20))
+    record_container.populate(read_container.fetch_all_reads_versions(), table='cds',
+                              workers=args.prefetch_workers,
+                              max_in_flight=args.prefetch_in_flight)
     print 'done'
     #----------------------------------#
     #-- MAP ALIGNMENTS TO GENES   -----#
@@ -10,7 +10,7 @@ import operator
 from utils.argparser import DefaultBinnerArgParser
 from ncbi.db.data_access import DataAccess
 from ncbi.taxonomy.tree import TaxTree
-from data.containers.read import ReadContainer
+from data.containers.columnar import ColumnarReadContainer
 
 import filters.readprocessing as rstate
 from filters.binning import bin_reads
@@ -45,12 +45,13 @@ def main():
     dataAccess = DataAccess(args)
 
     print '1. Loading tax tree...'
-    tax_tree = TaxTree()
+    tax_tree = TaxTree(args.tax_tree, args.tax_data)
     print 'done.'
 
     print '2. Loading alignment file...'
-    read_container = ReadContainer()
-    read_container.load_alignment_data(args.alignment_file)
+    read_container = ColumnarReadContainer()
+    read_container.load_alignment_data(args.alignment_file, workers=args.workers,
+                                       cache_fname=args.alignment_cache)
     #---SET TAXIDS FOR ALL ALIGNMENTS--#
     read_container.set_taxids(dataAccess)
     print 'done'
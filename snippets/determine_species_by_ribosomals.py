@@ -32,7 +32,7 @@ def main():
     dataAccess = DataAccess(args)
 
     print '1. Loading tax tree...'
-    tax_tree = TaxTree()
+    tax_tree = TaxTree(args.tax_tree, args.tax_data)
     print 'done.'
 
     # Get file contents
@@ -43,7 +43,7 @@ def main():
     print '1. Loading tax tree...'
     start = time.time()
 
-    tax_tree = TaxTree()
+    tax_tree = TaxTree(args.tax_tree, args.tax_data)
 
     end = time.time()
     print("done: {0:.2f} sec".format(end - start))
@@ -6,10 +6,11 @@ sys.path.append(os.getcwd()) # What's the purpose of this?
 from utils.argparser import DefaultBinnerArgParser
 from ncbi.db.data_access import DataAccess
 from ncbi.taxonomy.tree import TaxTree
-from data.containers.read import ReadContainer
+from data.containers.table import TableReadContainer
 
 #  For CDS loading
 from data.containers.record import RecordContainer
+from ncbi.db.record_cache import RecordCache
 from data.containers.cdsaln import CdsAlnContainer
 
 from utils.location import Location
@@ -76,12 +77,13 @@ def main():
     dataAccess = DataAccess(args)
 
     print '1. Loading tax tree...'
-    tax_tree = TaxTree()
+    tax_tree = TaxTree(args.tax_tree, args.tax_data)
     print 'done.'
 
     print '2. Loading alignment file...'
-    read_container = ReadContainer()
-    read_container.load_alignment_data(args.alignment_file)
+    read_container = TableReadContainer()
+    read_container.load_alignment_data(args.alignment_file, workers=args.workers,
+                                       cache_fname=args.alignment_cache)
     #---SET TAXIDS FOR ALL ALIGNMENTS--#
     read_container.set_taxids(dataAccess)
     print 'done'
@@ -95,7 +97,12 @@ def main():
     print '4. Loading referenced records...'
     record_container = RecordContainer()
     record_container.set_db_access(dataAccess)
-    record_container.populate(read_container.fetch_all_reads_versions(), table='cds')
+    if args.record_cache:
+        record_container.set_record_cache(RecordCache(args.record_cache,
+                                                      args.record_cache_size << 20))
+    record_container.populate(read_container.fetch_all_reads_versions(), table='cds',
+                              workers=args.prefetch_workers,
+                              max_in_flight=args.prefetch_in_flight)
     print 'done'
     #----------------------------------#
     #-- MAP ALIGNMENTS TO GENES   -----#
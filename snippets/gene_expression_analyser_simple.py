@@ -6,13 +6,11 @@ sys.path.append(os.getcwd())
 from utils.argparser import DefaultBinnerArgParser
 from ncbi.db.data_access import DataAccess
 from ncbi.taxonomy.tree import TaxTree
-from data.containers.read import ReadContainer
 
 import filters.host as host_filter
 
 #  For CDS loading
-from data.containers.record import RecordContainer
-from data.containers.cdsaln import CdsAlnContainer
+from data.containers.load import fill_containers_streaming
 
 from utils.location import Location
 
@@ -71,14 +69,18 @@ def main():
     dataAccess = DataAccess(args)
 
     #print '1. Loading tax tree...'
-    tax_tree = TaxTree()
+    tax_tree = TaxTree(args.tax_tree, args.tax_data)
     #print 'done.'
 
-    #print '2. Loading alignment file...'
-    read_container = ReadContainer()
-    read_container.load_alignment_data(args.alignment_file)
-    #---SET TAXIDS FOR ALL ALIGNMENTS--#
-    read_container.set_taxids(dataAccess)
+    #----------------------------------#
+    #------- ALIGNMENT DATA SOURCE ----#
+    # Alignment file is streamed in chunks of reads, each chunk gets #
+    # its tax IDs set, records loaded and its alignments mapped to   #
+    # genes before the next one is loaded                            #
+    #print '2. Loading alignment file & mapping alignments to genes...'
+    (record_container, cds_aln_container, read_count) = fill_containers_streaming(
+        args.alignment_file, dataAccess, args.chunk_size,
+        prefetch_workers=args.prefetch_workers, max_in_flight=args.prefetch_in_flight)
     #print 'done'
 
     '''
@@ -124,24 +126,6 @@ def main():
 
     # ------------------------------------- #
 
-    #----------------------------------#
-    #------- LOAD ALL RECORDS   -------#
-    #print '4. Loading referenced records...'
-    record_container = RecordContainer()
-    record_container.set_db_access(dataAccess)
-    record_container.populate(read_container.fetch_all_reads_versions(), table='cds')
-    #print 'done'
-    #----------------------------------#
-    #-- MAP ALIGNMENTS TO GENES   -----#
-    #print '5. Mapping alignments to genes...'
-    read_container.populate_cdss(record_container)
-    #----------------------------------#
-    #- RECORD ALL ALIGNEMENTS TO GENE -#
-    #print '6. Populating CDS container...'
-    cds_aln_container = CdsAlnContainer()
-    cds_aln_container.populate(read_container.fetch_all_reads(format=list))
-    #print 'done'
-
     #print("Loaded CDS container")
     
     # Take only CDSs of given tax_id
@@ -8,7 +8,7 @@ from utils.argparser import DefaultBinnerArgParser
 from ncbi.db.data_access import DataAccess
 from ncbi.taxonomy.tree import TaxTree
 import ncbi.taxonomy.ranks as tax_ranks
-from data.containers.read import ReadContainer
+from data.containers.table import TableReadContainer
 
 import filters.host as host_filter
 
@@ -216,6 +216,11 @@ def assignment_analysis(tax_ids, reads, tax_tree, export_folder, CDS_count=None)
     read2taxid = defaultdict(list)
     discared_reads = list()
 
+    # Species of all the alignments, looked up at once
+    aln_tax_ids = [aln.tax_id for read in reads for aln in read.get_alignments()]
+    aln_species = tax_tree.get_parents_with_rank(aln_tax_ids, 'species').tolist()
+    aln_offset  = 0
+
     for read in reads:
 
         # Skip reads without alignments
@@ -226,8 +231,11 @@ def assignment_analysis(tax_ids, reads, tax_tree, export_folder, CDS_count=None)
         # Get given species to which this read "fits"
         fits = set()
 
-        for aln in read.get_alignments():
-            tax_id = tax_tree.get_parent_with_rank(aln.tax_id, 'species')
+        aln_count = len(read.get_alignments())
+        read_species = aln_species[aln_offset:aln_offset + aln_count]
+        aln_offset += aln_count
+
+        for tax_id in read_species:
             if tax_id:
                 read2taxid[read.id].append(tax_id)
             if tax_id in tax_ids:
@@ -259,8 +267,7 @@ def assignment_analysis(tax_ids, reads, tax_tree, export_folder, CDS_count=None)
             species_set = set()
 
             taxa = list()
-            for aln in read.get_alignments():
-                tax_id = tax_tree.get_parent_with_rank(aln.tax_id, 'species')
+            for tax_id in read_species:
                 if tax_id in (0, 1):
                     continue
                 taxa.append(tax_id)
@@ -337,7 +344,7 @@ def main():
     print '1. Loading tax tree...'
     start = time.time()
 
-    tax_tree = TaxTree()
+    tax_tree = TaxTree(args.tax_tree, args.tax_data)
 
     end = time.time()
     print("done: {0:.2f} sec".format(end - start))
@@ -347,8 +354,9 @@ def main():
     print '2. Loading alignment file...'
     start = time.time()
 
-    read_container = ReadContainer()
-    read_container.load_alignment_data(args.alignment_file)
+    read_container = TableReadContainer()
+    read_container.load_alignment_data(args.alignment_file, workers=args.workers,
+                                       cache_fname=args.alignment_cache)
     #---SET TAXIDS FOR ALL ALIGNMENTS--#
     read_container.set_taxids(dataAccess)
 
@@ -416,7 +424,9 @@ def main():
 
     record_container = RecordContainer()
     record_container.set_db_access(dataAccess)
-    record_container.populate(read_container.fetch_all_reads_versions(), table='cds')
+    record_container.populate(read_container.fetch_all_reads_versions(), table='cds',
+                              workers=args.prefetch_workers,
+                              max_in_flight=args.prefetch_in_flight)
 
     end = time.time()
     print("done: {0:.2f} sec".format(end - start))
@@ -577,12 +587,10 @@ def main():
 
     CDS_count   = {}    # Count CDSs of each species
     species_set = set() # Get estimated tax_ids
-    for cds_aln in cds_alns_ribosomal:
-        tax_id = cds_aln.cds.taxon
-
-        # Put each tax_id up to the "species" level
-        tax_id_species = tax_tree.get_parent_with_rank(tax_id, 'species')
-
+    # Put each tax_id up to the "species" level
+    cds_species = tax_tree.get_parents_with_rank(
+        [cds_aln.cds.taxon for cds_aln in cds_alns_ribosomal], 'species').tolist()
+    for tax_id_species in cds_species:
         species_set.add(tax_id_species)
         CDS_count[tax_id_species] = CDS_count.get(tax_id_species, 0) + 1
 
@@ -10,7 +10,7 @@ sys.path.append(os.getcwd())
 from utils.argparser import DefaultBinnerArgParser
 from ncbi.db.data_access import DataAccess
 from ncbi.taxonomy.tree import TaxTree
-from data.containers.read import ReadContainer
+from data.containers.columnar import ColumnarReadContainer
 from data.containers.record import RecordContainer
 from data.containers.cdsaln import CdsAlnContainer
 import filters.host as host_filter
@@ -42,6 +42,15 @@ class TestRunArgParser(DefaultBinnerArgParser):
         self.add_argument('binner_input',
                 help='Alignment file for LCA binner',
                 type=str)
+        self.add_argument('--min-score',
+                help='LCA binner ignores alignments with lower score (MEGAN Min Score)',
+                type=float)
+        self.add_argument('--top-percent',
+                help='LCA binner uses only alignments within this percentage of the best score (MEGAN Top Percent)',
+                type=float)
+        self.add_argument('--min-support',
+                help='LCA binner reassigns reads of taxa with fewer reads to their ancestors (MEGAN Min Support)',
+                type=int)
 def main():
     '''
     Script to test accuracy of MEGAN vs LCA binner.
@@ -55,7 +64,7 @@ def main():
     dataAccess = DataAccess(args)
 
     print '1. Loading tax tree...'
-    tax_tree = TaxTree()
+    tax_tree = TaxTree(args.tax_tree, args.tax_data)
     print 'done.'
 
     print '2. Loading correct solution...'
@@ -75,14 +84,15 @@ def main():
     # ------------------- LCA ------------------- #
 
     print '5. Loading alignment file...'
-    read_container = ReadContainer()
-    read_container.load_alignment_data(args.binner_input)
+    read_container = ColumnarReadContainer()
+    read_container.load_alignment_data(args.binner_input, workers=args.workers,
+                                       cache_fname=args.alignment_cache)
     #---SET TAXIDS FOR ALL ALIGNMENTS--#
     read_container.set_taxids(dataAccess)
     print 'done'
 
     print '6. Creating LCA solution...'
-    lca_binner = LCABinner(tax_tree)
+    lca_binner = LCABinner(tax_tree, args.min_score, args.top_percent, args.min_support)
     sol_lca = lca_binner.bin_reads(read_container)
     print 'done'
 
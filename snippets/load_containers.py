@@ -10,9 +10,7 @@ sys.path.append(os.getcwd())
 from utils.argparser import DefaultBinnerArgParser
 from ncbi.db.data_access import DataAccess
 from ncbi.taxonomy.tree import TaxTree
-from data.containers.read import ReadContainer
-from data.containers.record import RecordContainer
-from data.containers.cdsaln import CdsAlnContainer
+from data.containers.load import fill_containers_streaming
 import filters.host as host_filter
 import filters.readprocessing as rstate
 from filters.binning import bin_reads
@@ -70,60 +68,45 @@ def main():
 
     #-------- TAXONOMY TREE -----------#
     print '1. Loading tax tree...'
-    tax_tree = TaxTree()
+    tax_tree = TaxTree(args.tax_tree, args.tax_data)
     # tax_tree.load_taxonomy_data(dataAccess)
     print 'done.'
 
-    #----------------------------------#
-    #------- ALIGNMENT DATA SOURCE ----#
-    print '2. Loading alignment file...'
-    read_container = ReadContainer()
-    read_container.load_alignment_data(args.input)
-    #---SET TAXIDS FOR ALL ALIGNMENTS--#
-    read_container.set_taxids(dataAccess)
-    print 'done'
-
     #------- FILTER HOST READS -------#
-    print '3. Filtering host reads & alignments...'
-    new_reads = host_filter.filter_potential_host_reads(
-        read_container.fetch_all_reads(format=list),
-        tax_tree.tax2relevantTax,
-        tax_tree.potential_hosts,
-        #delete_host_alignments =
-        True,
-        #filter_unassigned =
-        True,
-        #unassigned_taxid=
-        -1,
-        host_filter.perc_of_host_alignments_larger_than)
-    dataAccess.clear_cache()    # deletes gi2taxid cache
-    reads_with_no_host_alignments = host_filter.filter_potential_hosts_alignments(
-        new_reads,
-        tax_tree.tax2relevantTax,
-        tax_tree.potential_hosts,
-        True,   # delete host alignments
-        True,   # filter unassigned
-        -1)     # unassigned taxid
-    host_read_count = len(read_container.fetch_all_reads(format=list)) - len(reads_with_no_host_alignments)
-    read_container.set_new_reads(reads_with_no_host_alignments)
-    print 'done'
+    nonhost_read_count = [0]
+    def filter_host_reads (reads):
+        new_reads = host_filter.filter_potential_host_reads(
+            reads,
+            tax_tree.tax2relevantTax,
+            tax_tree.potential_hosts,
+            #delete_host_alignments =
+            True,
+            #filter_unassigned =
+            True,
+            #unassigned_taxid=
+            -1,
+            host_filter.perc_of_host_alignments_larger_than)
+        reads_with_no_host_alignments = host_filter.filter_potential_hosts_alignments(
+            new_reads,
+            tax_tree.tax2relevantTax,
+            tax_tree.potential_hosts,
+            True,   # delete host alignments
+            True,   # filter unassigned
+            -1)     # unassigned taxid
+        nonhost_read_count[0] += len(reads_with_no_host_alignments)
+        return reads_with_no_host_alignments
 
     #----------------------------------#
-    #------- LOAD ALL RECORDS   -------#
-    print '4. Loading referenced records...'
-    record_container = RecordContainer()
-    record_container.set_db_access(dataAccess)
-    record_container.populate(read_container.fetch_all_reads_versions(), table='cds')
-    record_container.populate(read_container.fetch_all_reads_versions(), table='rrna')
-    print 'done'
-    #----------------------------------#
-    #-- MAP ALIGNMENTS TO GENES   -----#
-    print '5. Mapping alignments to genes...'
-    read_container.populate_cdss(record_container)
-    #----------------------------------#
-    #- RECORD ALL ALIGNEMENTS TO GENE -#
-    cds_aln_container = CdsAlnContainer()
-    cds_aln_container.populate(read_container.fetch_all_reads(format=list))
+    #------- ALIGNMENT DATA SOURCE ----#
+    # Alignment file is streamed in chunks of reads, each chunk gets #
+    # its tax IDs set, host reads filtered, records loaded and its   #
+    # alignments mapped to genes before the next one is loaded       #
+    print '2. Loading alignment file, filtering host reads & mapping alignments to genes...'
+    (record_container, cds_aln_container, total_read_count) = fill_containers_streaming(
+        args.input, dataAccess, args.chunk_size, filter_host_reads, tables=('cds', 'rrna'),
+        prefetch_workers=args.prefetch_workers, max_in_flight=args.prefetch_in_flight)
+    dataAccess.clear_cache()    # deletes gi2taxid cache
+    host_read_count = total_read_count - nonhost_read_count[0]
     print 'done'
 
     #import pickle
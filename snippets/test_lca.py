@@ -10,7 +10,7 @@ sys.path.append(os.getcwd())
 from utils.argparser import DefaultBinnerArgParser
 from ncbi.db.data_access import DataAccess
 from ncbi.taxonomy.tree import TaxTree
-from data.containers.read import ReadContainer
+from data.containers.columnar import ColumnarReadContainer
 from data.containers.record import RecordContainer
 from data.containers.cdsaln import CdsAlnContainer
 import filters.host as host_filter
@@ -51,12 +51,13 @@ def main():
     dataAccess = DataAccess(args)
 
     print '1. Loading tax tree...'
-    tax_tree = TaxTree()
+    tax_tree = TaxTree(args.tax_tree, args.tax_data)
     print 'done.'
 
     print '2. Loading alignment file...'
-    read_container = ReadContainer()
-    read_container.load_alignment_data(args.input)
+    read_container = ColumnarReadContainer()
+    read_container.load_alignment_data(args.input, workers=args.workers,
+                                       cache_fname=args.alignment_cache)
     #---SET TAXIDS FOR ALL ALIGNMENTS--#
     read_container.set_taxids(dataAccess)
     print 'done'
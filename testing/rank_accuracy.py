@@ -3,6 +3,8 @@ from testing.solution import Solution
 from data.containers.read import ReadContainer
 from ncbi.taxonomy.tree import TaxTree
 
+import numpy
+
 class RankAccuracy(object):
     ''' Compares correct with given solution.
 
@@ -79,38 +81,29 @@ class RankAccuracy(object):
         # Initialize dictionary holding results
         self.__init_data()
 
-        # Examine every read
-        for read_id, tax_id in binner_sol.id2taxon.iteritems():
-            
-            # Now evaluate read assignment through all ranks
-            correct = correct_sol.get_tax_id(read_id)
-            matches = False
-            for rank in self.ranks:
-                if matches:
-                    self.data[rank]['True'] += 1 # If correct on lower, is also on higher level
-                    continue
-                    
-                try:
-                    parent = tax_tree.get_parent_with_rank(tax_id, rank)
-                except KeyError:
-                    # TODO: Do some logging for stats
-                    continue
-                correct_parent = tax_tree.get_parent_with_rank(correct, rank)
-
-                # If taxon is not specific enough
-                if parent == 0:
-                    continue
-
-                if parent == correct_parent:
-                    self.data[rank]['True'] += 1
-                    matches = True
-                else:
-                    # Propagate False to lower levels
-                    for rank2 in self.ranks:
-                        self.data[rank2]['False'] += 1
-                        if rank2 == rank:
-                            break
-
-                # Go up in tree
-                tax_id = parent
-                correct = correct_parent
+        # Examine all the reads at once, rank by rank
+        read_ids = binner_sol.id2taxon.keys()
+        tax_ids = [binner_sol.id2taxon[read_id] for read_id in read_ids]
+        correct = [correct_sol.get_tax_id(read_id) for read_id in read_ids]
+        matches = numpy.zeros(len(read_ids), dtype=bool)
+        for (i, rank) in enumerate(self.ranks):
+            # If correct on lower, is also on higher level
+            self.data[rank]['True'] += int(numpy.count_nonzero(matches))
+
+            parent = tax_tree.get_parents_with_rank(tax_ids, rank)
+            correct_parent = tax_tree.get_parents_with_rank(correct, rank)
+
+            # If taxon is not specific enough, it is skipped
+            evaluated = ~matches & (parent != 0)
+            correct_rank = evaluated & (parent == correct_parent)
+            self.data[rank]['True'] += int(numpy.count_nonzero(correct_rank))
+            matches |= correct_rank
+
+            # Propagate False to lower levels
+            false_count = int(numpy.count_nonzero(evaluated & ~correct_rank))
+            for rank2 in self.ranks[:i+1]:
+                self.data[rank2]['False'] += false_count
+
+            # Go up in tree
+            tax_ids = numpy.where(evaluated, parent, tax_ids)
+            correct = numpy.where(evaluated, correct_parent, correct)
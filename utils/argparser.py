@@ -19,6 +19,9 @@ class DefaultBinnerArgParser (argparse.ArgumentParser):
             help='CDS database connection string')
         mutexgroup_cds.add_argument('--cds-fasta',
             help='CDS fasta file location')
+        mutexgroup_cds.add_argument('--cds-store',
+            help='CDS store file location (exported with ncbi/db/cds_store.py), '
+                 'used instead of the CDS database')
 
         mutexgroup_tax = self.add_mutually_exclusive_group()
         mutexgroup_tax.add_argument('--ncbitax-db-connection',
@@ -26,14 +29,42 @@ class DefaultBinnerArgParser (argparse.ArgumentParser):
             help='NCBI Taxonomy database connection string')
         ncbi_tax_files = mutexgroup_tax.add_argument_group()
         ncbi_tax_files.add_argument('--gi2taxid',
-            help='NCBI Taxonomy gi2taxid dump file')
+            help='NCBI Taxonomy gi2taxid dump file, or the file converted '
+                 'with ncbi/db/ncbitax_from_file.py (memory mapped)')
         ncbi_tax_files.add_argument('--nodes',
             help='NCBI Taxonomy nodes dump')
         ncbi_tax_files.add_argument('--names',
             help='NCBI Taxonomy names dump')
         self.add_argument('-tt', '--tax-tree',
-           help='Taxonomy tree location',
-           default='./ncbi/taxonomy/.data/ncbi_tax_tree')
+           help='Taxonomy tree (ncbi_tax_tree) location. If not given, '
+                '$BINNER_TAX_TREE or .data/ncbi_tax_tree in the ncbi/taxonomy package '
+                'directory of the binner (not the current directory) is used')
+        self.add_argument('-td', '--tax-data',
+           help='Taxonomy names and ranks (taxid2namerank) location. If not given, '
+                '$BINNER_TAX_DATA or .data/taxid2namerank in the ncbi/taxonomy package '
+                'directory of the binner (not the current directory) is used')
+        self.add_argument('--workers',
+           help='Number of processes used for parsing the alignment file',
+           type=int, default=1)
+        self.add_argument('--chunk-size',
+           help='Number of reads held in memory at a time by snippets which '
+                'stream the alignment file',
+           type=int, default=100000)
+        self.add_argument('--alignment-cache',
+           help='Binary alignment cache file. Created if missing or older than the alignment file')
+        self.add_argument('--record-cache',
+           help='Persistent record cache file (SQLite), shared across runs. Created if missing')
+        self.add_argument('--record-cache-size',
+           help='Record cache size limit in MB, least recently used records are evicted',
+           type=int, default=1024)
+        self.add_argument('--prefetch-workers',
+           help='Number of threads (and database connections) fetching records '
+                'in batches. If not given, records are fetched sequentially',
+           type=int)
+        self.add_argument('--prefetch-in-flight',
+           help='Maximum number of record batches fetched at a time, '
+                'defaults to twice the number of prefetch workers',
+           type=int)
 
 
 def validate_args(args):
@@ -50,10 +81,22 @@ def validate_args(args):
     if args.cds_fasta is not None:
         if not os.path.exists(os.path.expanduser(args.cds_fasta)):
             print "CDS Fasta file %s doesn't exists" % args.descrargs.cds_fasta
+    if args.cds_store is not None:
+        if not os.path.exists(os.path.expanduser(args.cds_store)):
+            print "CDS store file %s doesn't exist." % args.cds_store
+            error = True
     if args.gi2taxid is not None:
         if not os.path.exists(os.path.expanduser(args.gi2taxid)):
             print "gi_taxid_[nucl/prot] file %s doesn't exist." % args.gi2taxid
             error = True
+    if args.tax_tree is not None:
+        if not os.path.exists(os.path.expanduser(args.tax_tree)):
+            print "Taxonomy tree file %s doesn't exist." % args.tax_tree
+            error = True
+    if args.tax_data is not None:
+        if not os.path.exists(os.path.expanduser(args.tax_data)):
+            print "Taxonomy data file %s doesn't exist." % args.tax_data
+            error = True
     if args.nodes is not None:
         if not os.path.exists(os.path.expanduser(args.nodes)):
             print "nodes dump file %s doesn't exist." % args.nodes
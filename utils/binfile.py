@@ -0,0 +1,147 @@
+'''
+Simple binary container for numpy arrays which can be memory
+mapped back without parsing.
+
+File layout:
+* magic string (8 bytes)
+* header length (8 bytes, little endian)
+* JSON header: file type, attributes, and dtype, shape and offset
+  of each array
+* raw array data, each array aligned to ALIGNMENT bytes
+'''
+import json
+import struct
+import numpy
+
+MAGIC       = 'TBBIN001'
+ALIGNMENT   = 64
+
+class BinaryFileError(ValueError):
+    pass
+
+def write_arrays(fname, file_type, arrays, attributes=None):
+    '''
+    Writes arrays into a binary container file.
+
+    :param fname path of the output file
+    :param file_type (str) stored in the header and checked when reading
+    :param arrays dict(key=name:str, value=numpy array)
+    :param attributes dict of JSON serializable values
+    '''
+    names = sorted(arrays.keys())
+    arrays = dict((name, numpy.ascontiguousarray(arrays[name])) for name in names)
+
+    # offsets are relative to the start of the data section
+    index = {}
+    offset = 0
+    for name in names:
+        array = arrays[name]
+        index[name] = {'dtype'  : array.dtype.str,
+                       'shape'  : list(array.shape),
+                       'offset' : offset}
+        offset = _align(offset + array.nbytes)
+
+    header = json.dumps({'type'       : file_type,
+                         'attributes' : attributes or {},
+                         'arrays'     : index})
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    fhandle = open(fname, 'wb')
+    try:
+        fhandle.write(MAGIC)
+        fhandle.write(struct.pack('<Q', len(header)))
+        fhandle.write(header)
+        for name in names:
+            fhandle.seek(data_start + index[name]['offset'])
+            fhandle.write(arrays[name].tostring())
+        fhandle.truncate(data_start + offset)
+    finally:
+        fhandle.close()
+
+def read_header(fname, file_type):
+    '''
+    Reads the header of a binary container file.
+
+    :rtype tuple(header:dict, data_start:int)
+    :raises BinaryFileError if the file is not a binary container
+    of the given type
+    '''
+    fhandle = open(fname, 'rb')
+    try:
+        magic = fhandle.read(len(MAGIC))
+        if magic != MAGIC:
+            raise BinaryFileError('%s is not a binary container file.' % fname)
+        (header_len,) = struct.unpack('<Q', fhandle.read(8))
+        header = json.loads(fhandle.read(header_len))
+    finally:
+        fhandle.close()
+    if header['type'] != file_type:
+        raise BinaryFileError('%s contains %s, expected %s.' % (fname, header['type'], file_type))
+    return (header, _align(len(MAGIC) + 8 + header_len))
+
+def read_arrays(fname, file_type, mode='r'):
+    '''
+    Opens arrays stored in a binary container file as memory maps.
+
+    :param mode numpy.memmap mode ('r' for read only, 'c' for copy on write)
+    :rtype tuple(arrays:dict(key=name, value=numpy.memmap), attributes:dict)
+    '''
+    (header, data_start) = read_header(fname, file_type)
+    arrays = {}
+    for (name, info) in header['arrays'].items():
+        dtype = numpy.dtype(str(info['dtype']))
+        shape = tuple(info['shape'])
+        if numpy.prod(shape) == 0:
+            # empty arrays cannot be mapped
+            arrays[str(name)] = numpy.zeros(shape, dtype=dtype)
+        else:
+            arrays[str(name)] = numpy.memmap(fname, dtype=dtype, mode=mode,
+                                             offset=data_start + info['offset'],
+                                             shape=shape)
+    return (arrays, header['attributes'])
+
+def pack_strings(strings):
+    '''
+    Packs strings into a single byte buffer.
+
+    :rtype tuple(buffer:numpy.uint8 array, offsets:numpy.int64 array)
+    String i is buffer[offsets[i]:offsets[i+1]].
+    '''
+    strings = list(strings)
+    offsets = numpy.zeros(len(strings) + 1, dtype=numpy.int64)
+    if strings:
+        numpy.cumsum([len(string) for string in strings], out=offsets[1:])
+    buf = numpy.frombuffer(''.join(strings), dtype=numpy.uint8) if offsets[-1] \
+          else numpy.zeros(0, dtype=numpy.uint8)
+    return (buf, offsets)
+
+
+class StringTable (object):
+    '''
+    Read only list of strings stored in a packed buffer
+    (see pack_strings). Strings are created on access.
+    '''
+
+    def __init__(self, buf, offsets):
+        self.buf        = buf
+        self.offsets    = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError('String table index out of range')
+        return self.buf[self.offsets[i]:self.offsets[i+1]].tostring()
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def tolist(self):
+        return list(self)
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
@@ -0,0 +1,216 @@
+'''
+Transparent reading of compressed input files.
+
+Compression is determined by the file extension:
+* .gz, .bgz   - gzip. BGZF (bgzip) files consist of independent blocks
+                which are decompressed in parallel by a pool of threads.
+* .zst, .zstd - Zstandard (requires the zstandard package).
+Other files are opened as they are.
+'''
+import collections
+import io
+import multiprocessing
+import struct
+import zlib
+from multiprocessing.pool import ThreadPool
+
+GZIP_EXTENSIONS = ('.gz', '.bgz')
+ZSTD_EXTENSIONS = ('.zst', '.zstd')
+
+BUFFER_SIZE = 1 << 20
+# Number of BGZF blocks (at most 64 kB each) decompressed by one task
+BGZF_BATCH_SIZE = 64
+
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+_BGZF_HEADER = '\x1f\x8b\x08\x04'
+
+def get_compression (fname):
+    '''
+    :rtype str: 'gzip', 'zstd' or None for uncompressed files
+    '''
+    lower = fname.lower()
+    if lower.endswith(GZIP_EXTENSIONS):
+        return 'gzip'
+    if lower.endswith(ZSTD_EXTENSIONS):
+        return 'zstd'
+    return None
+
+def is_compressed (fname):
+    return get_compression(fname) is not None
+
+def is_bgzf (fname):
+    ''' Returns True if the file starts with a BGZF block.
+    '''
+    fhandle = open(fname, 'rb')
+    try:
+        header = fhandle.read(12)
+        if len(header) < 12 or not header.startswith(_BGZF_HEADER):
+            return False
+        return _get_bgzf_block_size(fhandle, header) is not None
+    finally:
+        fhandle.close()
+
+def open_input (fname, threads=None):
+    '''
+    Opens a possibly compressed file for reading.
+    Returned object supports iteration over lines, readline(s),
+    read and close, the same as a file opened with open(fname, 'r').
+
+    :param threads (int) number of threads decompressing BGZF blocks.
+    Defaults to the number of CPUs.
+    :raises ImportError if the file is Zstandard compressed and the
+    zstandard package is not installed
+    '''
+    compression = get_compression(fname)
+    if compression is None:
+        return open(fname, 'r')
+    if compression == 'gzip':
+        if is_bgzf(fname):
+            chunks = _iter_bgzf(fname, threads or multiprocessing.cpu_count())
+        else:
+            chunks = _iter_gzip(fname)
+    else:
+        chunks = _iter_zstd(fname)
+    return io.BufferedReader(_ChunkStream(chunks), BUFFER_SIZE)
+
+
+class _ChunkStream (io.RawIOBase):
+    ''' Raw stream reading from a generator of decompressed chunks.
+    '''
+
+    def __init__ (self, chunks):
+        io.RawIOBase.__init__(self)
+        self._chunks    = chunks
+        self._chunk     = ''
+        self._pos       = 0
+
+    def readable (self):
+        return True
+
+    def readinto (self, buf):
+        while self._pos >= len(self._chunk):
+            try:
+                self._chunk = self._chunks.next()
+            except StopIteration:
+                return 0
+            self._pos = 0
+        size = min(len(buf), len(self._chunk) - self._pos)
+        buf[:size] = self._chunk[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def close (self):
+        if not self.closed:
+            self._chunks.close()
+        io.RawIOBase.close(self)
+
+
+def _iter_gzip (fname):
+    ''' Decompresses a (possibly multi member) gzip file.
+        @return generator of decompressed chunks
+    '''
+    fhandle = open(fname, 'rb')
+    try:
+        decompressor = zlib.decompressobj(_GZIP_WBITS)
+        while True:
+            data = fhandle.read(BUFFER_SIZE)
+            if not data:
+                break
+            while data:
+                chunk = decompressor.decompress(data)
+                if chunk:
+                    yield chunk
+                # data past the end of a member starts the next member
+                data = decompressor.unused_data
+                if data:
+                    decompressor = zlib.decompressobj(_GZIP_WBITS)
+        chunk = decompressor.flush()
+        if chunk:
+            yield chunk
+    finally:
+        fhandle.close()
+
+def _iter_zstd (fname):
+    ''' Decompresses a Zstandard file.
+        @return generator of decompressed chunks
+    '''
+    import zstandard
+    fhandle = open(fname, 'rb')
+    try:
+        reader = zstandard.ZstdDecompressor().stream_reader(fhandle, read_across_frames=True)
+        while True:
+            chunk = reader.read(BUFFER_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fhandle.close()
+
+def _iter_bgzf (fname, threads):
+    ''' Decompresses a BGZF file. Batches of blocks are decompressed
+        by a thread pool (zlib releases the GIL), at most 2 * threads
+        batches are in flight at a time.
+        @return generator of decompressed chunks, in file order
+    '''
+    fhandle = open(fname, 'rb')
+    pool = ThreadPool(threads)
+    try:
+        pending = collections.deque()
+        batch = []
+        for block in _iter_bgzf_blocks(fhandle):
+            batch.append(block)
+            if len(batch) < BGZF_BATCH_SIZE:
+                continue
+            pending.append(pool.apply_async(_inflate_blocks, (batch,)))
+            batch = []
+            if len(pending) >= 2 * threads:
+                yield pending.popleft().get()
+        if batch:
+            pending.append(pool.apply_async(_inflate_blocks, (batch,)))
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        fhandle.close()
+
+def _iter_bgzf_blocks (fhandle):
+    ''' Splits BGZF file into compressed blocks (without decompressing).
+        @raise IOError if the file is not a valid BGZF file
+    '''
+    while True:
+        header = fhandle.read(12)
+        if not header:
+            return
+        if len(header) < 12 or not header.startswith(_BGZF_HEADER):
+            raise IOError('Invalid BGZF block header.')
+        block_size = _get_bgzf_block_size(fhandle, header)
+        if block_size is None:
+            raise IOError('BGZF block without block size.')
+        (xlen,) = struct.unpack('<H', header[10:12])
+        fhandle.seek(-xlen, 1)
+        block = header + fhandle.read(block_size - 12)
+        if len(block) != block_size:
+            raise IOError('Truncated BGZF block.')
+        yield block
+
+def _get_bgzf_block_size (fhandle, header):
+    ''' Reads the extra field following the block header
+        and returns the total block size (None if missing).
+    '''
+    (xlen,) = struct.unpack('<H', header[10:12])
+    extra = fhandle.read(xlen)
+    pos = 0
+    while pos + 4 <= len(extra):
+        (subfield_id, subfield_len) = struct.unpack('<2sH', extra[pos:pos+4])
+        if subfield_id == 'BC' and subfield_len == 2:
+            return struct.unpack('<H', extra[pos+4:pos+6])[0] + 1
+        pos += 4 + subfield_len
+    return None
+
+def _inflate_blocks (blocks):
+    chunks = []
+    for block in blocks:
+        decompressor = zlib.decompressobj(_GZIP_WBITS)
+        chunks.append(decompressor.decompress(block))
+        chunks.append(decompressor.flush())
+    return ''.join(chunks)
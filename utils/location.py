@@ -491,6 +491,19 @@ class Location(object):
                            positions,
                            sys.maxint)
     
+    @classmethod
+    def fast_span_str(cls, location_str):
+        '''
+        Like fast_min_str, finds the span of the location without parsing it.
+        :return: tuple(min position, max position), None if the location
+                 contains no positions
+        '''
+        positions = [int(p) for p in _fast_min_pattern.sub(
+                     ' ', location_str).split()]
+        if not positions:
+            return None
+        return (min(positions), max(positions))
+
     
     def find_intersection (self, location):
         '''
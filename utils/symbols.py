@@ -0,0 +1,32 @@
+'''
+Symbol tables keeping a single shared instance of frequently repeated
+strings (e.g. nucleotide accessions of alignments), so that every
+distinct string is stored only once.
+A symbol table belongs to the container that uses it and is released
+together with it.
+'''
+
+class SymbolTable (object):
+    ''' Set of strings which returns the shared instance of a string
+        equal to the given one.
+    '''
+
+    def __init__(self):
+        '''
+        (dict) symbols Maps symbol to its shared instance.
+        '''
+        self.symbols = {}
+
+    def canonical (self, symbol):
+        ''' Returns the shared instance of the symbol string,
+            the symbol becomes the shared instance if it has not
+            been seen before.
+            @param symbol (str)
+        '''
+        return self.symbols.setdefault(symbol, symbol)
+
+    def __contains__ (self, symbol):
+        return symbol in self.symbols
+
+    def __len__ (self):
+        return len(self.symbols)